@@ -1,65 +1,152 @@
 import requests
-import gspread
+from requests.adapters import HTTPAdapter
 from oauth2client.service_account import ServiceAccountCredentials
-import datetime
+from sheets_client import SCOPE, SheetsPool
+from stations import STATION_BACKENDS
+from parking_parser import SpotReading, parse_spots
+from occupancy_store import OccupancyStore, from_epoch
+import perf
+from collections import defaultdict
+import argparse
+import asyncio
+import os
 import pytz
 import time
+import urllib.parse
 
 # --- 設定區域 ---
 TW_TIMEZONE = pytz.timezone('Asia/Taipei')
-JSON_FILE = 'service_account.json' 
-SHEET_NAME = '客服作業表'      
-WORKSHEET_NAME = '車位紀錄'   
-
-def get_realtime_spots():
-    # 碧華國小停車場代碼
-    # 直接抓取新北交通局後端 API (較不容易被阻擋)
-    url = "https://www.parkinginfo.ntpc.gov.tw/parkingrealInfo/RealtimeInfo.ashx"
-    
+JSON_FILE = 'service_account.json'
+SHEET_NAME = '客服作業表'
+WORKSHEET_NAME = '車位紀錄'
+
+# 直接抓取新北交通局後端 API (較不容易被阻擋)；測試時可用環境變數指向本機 stub server
+API_URL = os.environ.get("PARKING_API_URL", "https://www.parkinginfo.ntpc.gov.tw/parkingrealInfo/RealtimeInfo.ashx")
+# 監看的停車場清單：環境變數 PARKING_LOTS (逗號分隔) 優先，預設為碧華國小 + 所有有後台的場站
+PARKING_LOTS = [s.strip() for s in os.environ.get("PARKING_LOTS", "").split(",") if s.strip()] \
+    or ["碧華國小"] + list(STATION_BACKENDS)
+
+# --- 並行抓取參數 ---
+MAX_PER_HOST = 4         # 同一主機同時進行的請求數
+MIN_INTERVAL = 0.2       # 秒：同一主機兩次請求的最小間隔
+REQUEST_TIMEOUT = 20
+
+# 網頁程序內常駐紀錄的輪詢間隔 (秒)；預設 0 停用，由 GitHub Actions 每小時排程紀錄
+# 每輪每個停車場鏡像一列到「車位紀錄」，間隔過短會快速消耗試算表的儲存格上限
+RECORD_INTERVAL = float(os.environ.get("OCCUPANCY_RECORD_INTERVAL", "0"))
+
+def make_session():
+    # 共用連線池，同一主機的請求重用 keep-alive 連線
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=MAX_PER_HOST * 2)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_realtime_spots(lot_name="碧華國小", session=None):
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36',
-        'Referer': 'https://www.parkinginfo.ntpc.gov.tw/parkingrealInfo/?parkinglotname=%E7%A2%A7%E8%8F%AF%E5%9C%8B%E5%B0%8F'
+        'Referer': f'https://www.parkinginfo.ntpc.gov.tw/parkingrealInfo/?parkinglotname={urllib.parse.quote(lot_name)}'
     }
 
     try:
         # 使用 Session 並帶入搜尋參數
-        params = {'parkinglotname': '碧華國小'}
-        response = requests.get(url, params=params, headers=headers, timeout=20)
-        
-        # 檢查網頁內容
-        from bs4 import BeautifulSoup
-        soup = BeautifulSoup(response.text, 'html.parser')
-        spots_element = soup.find("span", {"id": "ContentPlaceHolder1_lblAvailableCar"})
-        
-        if spots_element and spots_element.text.strip().isdigit():
-            return spots_element.text.strip()
-            
-        # 備選方案：如果標籤失效，嘗試解析全網頁純數字
-        text_content = soup.get_text()
-        if "剩餘車位" in text_content:
-            import re
-            numbers = re.findall(r'\d+', text_content)
-            if numbers:
-                return numbers[0]
-                
-        return "暫無數據"
+        params = {'parkinglotname': lot_name}
+        with perf.span("parking.fetch", lot=lot_name):
+            response = (session or requests).get(API_URL, params=params, headers=headers, timeout=REQUEST_TIMEOUT)
+        with perf.span("parking.parse"):
+            return parse_spots(response.content)
     except Exception as e:
-        return f"連線異常"
+        perf.incr("parking.fetch_error")
+        return SpotReading.failed("連線異常")
+
+class HostLimiter:
+    """每個主機的並行數上限與最小請求間隔 (需在事件迴圈內建立)"""
+
+    def __init__(self, max_concurrent=MAX_PER_HOST, min_interval=MIN_INTERVAL):
+        self._sems = defaultdict(lambda: asyncio.Semaphore(max_concurrent))
+        self._locks = defaultdict(asyncio.Lock)
+        self._last = defaultdict(float)
+        self._min_interval = min_interval
 
-def update_google_sheet(spots):
+    async def run(self, host, fn, *args):
+        loop = asyncio.get_running_loop()
+        async with self._sems[host]:
+            async with self._locks[host]:
+                wait = self._last[host] + self._min_interval - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                self._last[host] = loop.time()
+            # requests 為阻塞 I/O，交給執行緒池並行
+            return await asyncio.to_thread(fn, *args)
+
+async def poll_lots(lots, session):
+    """並行抓取所有停車場，回傳 [(停車場, 剩餘車位), ...]"""
+    limiter = HostLimiter()
+    host = urllib.parse.urlsplit(API_URL).netloc
+    results = await asyncio.gather(*(limiter.run(host, get_realtime_spots, lot, session) for lot in lots))
+    return list(zip(lots, results))
+
+_pool = None
+
+def get_pool():
+    # 同一程序只授權一次，之後重用連線與 worksheet 物件
+    global _pool
+    if _pool is None:
+        creds = ServiceAccountCredentials.from_json_keyfile_name(JSON_FILE, SCOPE)
+        _pool = SheetsPool(creds)
+    return _pool
+
+def update_google_sheet(store, pool=None):
+    # 本地尚未同步的讀數合併成一次 append_rows；失敗時留在本地，下一輪再送
+    # 欄位：時間 (含年份)、剩餘車位 (數字)、停車場、錯誤說明
     try:
-        scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-        creds = ServiceAccountCredentials.from_json_keyfile_name(JSON_FILE, scope)
-        client = gspread.authorize(creds)
-        
-        sheet = client.open(SHEET_NAME).worksheet(WORKSHEET_NAME)
-        now = datetime.datetime.now(TW_TIMEZONE).strftime("%m/%d %H:%M")
-        
-        sheet.append_row([now, spots])
-        print(f"✅ 寫入成功：{spots}")
+        pending = store.pending_mirror()
+        if not pending:
+            return
+        sheet = (pool or get_pool()).worksheet(SHEET_NAME, WORKSHEET_NAME)
+        with perf.span("parking.mirror", rows=len(pending)):
+            sheet.append_rows([[from_epoch(ts).strftime("%Y-%m-%d %H:%M"), "" if spots is None else spots, lot, error or ""]
+                               for _, ts, lot, spots, error in pending])
+        store.mark_mirrored([p[0] for p in pending])
+        print(f"✅ 寫入成功：{len(pending)} 筆")
     except Exception as e:
         print(f"❌ 寫入失敗: {e}")
 
+def run_cycle(lots, session, store, pool=None):
+    # 先寫入本地時間序列，再批次鏡像到 Google Sheets
+    with perf.span("parking.poll_cycle", lots=len(lots)):
+        readings = asyncio.run(poll_lots(lots, session))
+    with perf.span("occupancy.append"):
+        store.append(readings)
+    update_google_sheet(store, pool)
+
+def record_forever(interval, store, lots=PARKING_LOTS, pool=None, report=False):
+    """常駐模式：每 interval 秒輪詢一輪。
+    圖表讀取的是網頁主機上的 occupancy.db，因此必須與網頁在同一台主機常駐執行
+    (--interval 或由網頁程序在背景執行緒呼叫)；GitHub Actions 的 runner 每次執行完即丟棄，寫入的 DB 網頁讀不到。"""
+    session = make_session()
+    while True:
+        started = time.monotonic()
+        try:
+            run_cycle(lots, session, store, pool)
+        except Exception as e:
+            perf.incr("parking.cycle_error")
+            print(f"❌ 本輪紀錄失敗: {e}")
+        if report:
+            print(perf.export_json())
+        time.sleep(max(0, interval - (time.monotonic() - started)))
+
 if __name__ == "__main__":
-    current_spots = get_realtime_spots()
-    update_google_sheet(current_spots)
+    parser = argparse.ArgumentParser(description="停車場剩餘車位紀錄")
+    parser.add_argument("--interval", type=float, default=0, help="常駐模式的輪詢間隔 (秒)；0 為只執行一輪 (排程使用)")
+    parser.add_argument("--perf", action="store_true", help="每輪結束後輸出效能摘要 (JSON)")
+    args = parser.parse_args()
+
+    store = OccupancyStore()
+    if args.interval:
+        record_forever(args.interval, store, report=args.perf)
+    else:
+        run_cycle(PARKING_LOTS, make_session(), store)
+        if args.perf:
+            print(perf.export_json())
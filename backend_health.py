@@ -0,0 +1,87 @@
+"""場站後台健康檢查：背景執行緒定期並行探測 STATION_BACKENDS，網頁端只讀取快取狀態"""
+import re
+import threading
+import time
+import urllib.parse
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Optional
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+import perf
+
+PROBE_INTERVAL = 60      # 秒：兩輪探測的間隔
+PROBE_TIMEOUT = 3        # 秒：連線 / 讀取逾時
+MAX_WORKERS = 16
+
+
+def _ignore_insecure_warnings(urls):
+    """場站設備多為自簽憑證的 IP 位址，探測時不驗證憑證；只略過這些主機的 InsecureRequestWarning，
+    程序內其他 HTTPS 請求照常警告 (並行探測無法以非執行緒安全的 warnings.catch_warnings 包住)"""
+    hosts = sorted({urllib.parse.urlsplit(u).hostname for u in urls} - {None})
+    if hosts:
+        warnings.filterwarnings(
+            "ignore", message=f"Unverified HTTPS request is being made to host '({'|'.join(map(re.escape, hosts))})'",
+            category=urllib3.exceptions.InsecureRequestWarning)
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    up: bool
+    latency_ms: Optional[float]
+    status_code: Optional[int]
+    error: Optional[str]
+    checked_at: float
+
+
+class BackendHealth:
+    """status(場站) 立即回傳最近一次的探測結果 (尚未探測為 None)，不會觸發任何網路請求。"""
+
+    def __init__(self, backends, interval=PROBE_INTERVAL, timeout=PROBE_TIMEOUT, start=True):
+        self._backends = dict(backends)
+        _ignore_insecure_warnings(self._backends.values())
+        self._interval = interval
+        self._timeout = timeout
+        self._lock = threading.Lock()
+        self._results = {}
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=len(self._backends) or 1, pool_maxsize=2)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="backend-probe")
+        if start:
+            threading.Thread(target=self._run, name="backend-health", daemon=True).start()
+
+    def probe(self, url):
+        t0 = time.perf_counter()
+        try:
+            # HEAD 沒有回應內容，不下載整個頁面，連線也能放回連線池重複使用
+            # (設備不支援 HEAD 時回應 405，仍視為在線)
+            code = self._session.head(url, timeout=self._timeout, verify=False, allow_redirects=False).status_code
+            latency = (time.perf_counter() - t0) * 1000
+            return ProbeResult(code < 500, latency, code, None if code < 500 else f"HTTP {code}", time.time())
+        except requests.RequestException as e:
+            return ProbeResult(False, None, None, type(e).__name__, time.time())
+
+    def check_all(self):
+        """並行探測所有後台一次並更新快取"""
+        names = list(self._backends)
+        with perf.span("backend_health.check_all"):
+            results = list(self._executor.map(self.probe, [self._backends[n] for n in names]))
+        for name, result in zip(names, results):
+            with self._lock:
+                self._results[name] = result
+
+    def _run(self):
+        while True:
+            started = time.monotonic()
+            self.check_all()
+            time.sleep(max(0, self._interval - (time.monotonic() - started)))
+
+    def status(self, station):
+        with self._lock:
+            return self._results.get(station)
@@ -0,0 +1,179 @@
+"""離線效能基準：以記憶體內的假 Sheets (bench/fake_gspread.py) 驅動 app 使用的同一批模組，
+量測各情境的 p50 / p95，並與 bench/thresholds.json 比較，超過門檻時以非 0 結束 (部署前檢查用)
+
+    python bench/app_bench.py [--sizes 1000,10000,100000] [--latency-ms 80] [--error-rate 0.02] [--repeat 20]
+    python bench/app_bench.py --write-thresholds   # 以本次結果 ×1.5 更新門檻
+"""
+import argparse
+import datetime
+import json
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+import perf  # noqa: E402
+import write_queue  # noqa: E402
+from case_store import CaseStore  # noqa: E402
+from change_feed import ChangeFeed  # noqa: E402
+from case_table import ROW_COL, build_case_table, date_slice, time_slice  # noqa: E402
+from report_export import export_bytes  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+from sheets_client import SheetsPool  # noqa: E402
+from stats_cube import StatsCube  # noqa: E402
+
+from fake_gspread import CATEGORIES, FakeClient, make_history  # noqa: E402
+
+THRESHOLDS = pathlib.Path(__file__).resolve().parent / "thresholds.json"
+TITLE = "客服作業表"
+PAGE_SIZE = 20
+SEARCH_QUERIES = ["華視", "station:碧華 cat:發票", "plate:ABC", "0912", "遠端重新開機", "staff:美妞"]
+STAT_CATEGORIES = [c for c in CATEGORIES if c != "其他"]
+
+
+def _pct(vals, q):
+    vals = sorted(vals)
+    return vals[min(len(vals) - 1, round(q * (len(vals) - 1)))]
+
+
+def measure(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+class App:
+    """app 在單一程序內持有的共用物件 (對應 streamlit_app 的 st.cache_resource)"""
+
+    def __init__(self, pool, journal):
+        self.pool = pool
+        self.store = CaseStore()
+        self.index = SearchIndex()
+        self.cube = StatsCube(exclude=("其他",))
+        self.store.add_observer(self.index)
+        self.store.add_observer(self.cube)
+        self.queue = write_queue.WriteQueue(lambda: pool.worksheet(TITLE), self.store, journal)
+        self.feed = ChangeFeed(self.store, lambda: pool.worksheet(TITLE), start=False)   # 由 feed_poll 情境手動同步
+        self._tables = {}
+
+    def case_table(self):
+        version, rows = self.feed.snapshot()
+        if version not in self._tables:  # build_case_table_cached(max_entries=2)
+            self._tables = {version: build_case_table(rows)}
+        return version, rows, self._tables[version]
+
+    # --- 情境 ---
+    def tab1_rerun(self):
+        _, rows, table = self.case_table()
+        since = datetime.datetime.now() - datetime.timedelta(hours=8)
+        display = [(int(i), rows[i - 1]) for i in time_slice(table, since)[ROW_COL]]
+        display += [(None, r) for r in self.queue.pending_rows()]
+        return display[::-1][:PAGE_SIZE]
+
+    def search(self, query):
+        _, rows, _ = self.case_table()
+        return [(i, rows[i - 1]) for i in self.index.search(query) if i <= len(rows)][::-1][:PAGE_SIZE]
+
+    def tab2_render(self, days=30):
+        self.case_table()
+        last = self.cube.last_day()
+        wk = self.cube.frame(last - datetime.timedelta(days=days - 1), last)
+        for s, e in ((last - datetime.timedelta(days=13), last - datetime.timedelta(days=7)),
+                     (last - datetime.timedelta(days=6), last)):
+            self.cube.frame(s, e).groupby("類別")["件數"].sum().reindex(STAT_CATEGORIES, fill_value=0)
+        wk.groupby("類別")["件數"].sum().sort_values(ascending=False)
+        top10 = wk.groupby("場站")["件數"].sum().sort_values(ascending=False).head(10)
+        wk[wk["場站"].isin(top10.index)].groupby(["場站", "類別"])["件數"].sum()
+        wk.groupby("日期")["件數"].sum()
+
+    def excel_export(self, days=30):
+        _, _, table = self.case_table()
+        last = self.cube.last_day()
+        wk = date_slice(table, last - datetime.timedelta(days=days - 1), last)
+        wk = wk[wk[wk.columns[5]] != "其他"].drop(columns=[ROW_COL])
+        return export_bytes(wk, "Excel (.xlsx)")
+
+
+def run_size(n, args, workdir):
+    # 配額錯誤只注入寫入：app 的讀取失敗會直接顯示錯誤頁，沒有可量測的重試行為
+    client = FakeClient(latency_ms=args.latency_ms, error_rate=args.error_rate, write_errors_only=True, seed=n)
+    client.create(TITLE, make_history(n, seed=n))
+    pool = SheetsPool(client=client)
+    app = App(pool, os.path.join(workdir, f"journal_{n}.jsonl"))
+    results = {}
+
+    t0 = time.perf_counter()
+    app.tab1_rerun()   # 冷啟動：全量載入 + 建立資料表
+    results["tab1_cold"] = [(time.perf_counter() - t0) * 1000]
+    results["search_build"] = measure(lambda: app.search("華視"), 1)   # 索引於第一次查詢時建立
+
+    results["tab1_rerun"] = measure(app.tab1_rerun, args.repeat)
+    results["feed_poll"] = measure(app.feed.poll, args.repeat)   # 背景同步一次 (與 session 數無關)
+    queries = iter(SEARCH_QUERIES * args.repeat)
+    results["search"] = measure(lambda: app.search(next(queries)), args.repeat)
+
+    # 送出：submit 為使用者感受到的延遲 (寫入本地日誌)；submit_flush 為寫入雲端並修補本地資料的時間 (含重試)
+    enqueue, flush = [], []
+    for i in range(max(1, args.repeat // 4)):
+        row = make_history(1, seed=i)[1]
+        t0 = time.perf_counter()
+        app.queue.enqueue_append(row)
+        enqueue.append((time.perf_counter() - t0) * 1000)
+        while app.queue.pending_count():
+            time.sleep(0.001)
+        flush.append((time.perf_counter() - t0) * 1000)
+    results["submit"], results["submit_flush"] = enqueue, flush
+
+    results["tab2_render"] = measure(app.tab2_render, args.repeat)
+    results["excel_export"] = measure(app.excel_export, max(1, args.repeat // 4))
+    api = dict(pool.total, errors=client.calls["errors"])
+    return {k: v for k, v in results.items() if v}, api
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="1000,10000,100000", help="合成案件筆數 (逗號分隔)")
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="每次 Sheets API 呼叫的平均延遲")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="每次 Sheets 寫入呼叫回傳 429 的機率")
+    ap.add_argument("--repeat", type=int, default=20, help="每個情境的重複次數")
+    ap.add_argument("--write-thresholds", action="store_true", help="以本次 p95 ×1.5 覆寫 thresholds.json")
+    args = ap.parse_args()
+
+    write_queue.FLUSH_INTERVAL = 0.05
+    write_queue.MAX_BACKOFF = 0.5
+    thresholds = json.loads(THRESHOLDS.read_text(encoding="utf-8")) if THRESHOLDS.exists() else {}
+    new_thresholds, failures = {k: v for k, v in thresholds.items() if k.startswith("_")}, []
+
+    print(f"{'筆數':>7s} {'情境':14s} {'次數':>4s} {'p50 ms':>9s} {'p95 ms':>9s} {'門檻 ms':>9s}")
+    with tempfile.TemporaryDirectory() as workdir:
+        for n in (int(s) for s in args.sizes.split(",")):
+            perf.reset()
+            results, api = run_size(n, args, workdir)
+            limits = thresholds.get(str(n), {})
+            for name, samples in results.items():
+                p50, p95 = _pct(samples, 0.5), _pct(samples, 0.95)
+                limit = limits.get(name)
+                flag = ""
+                if limit is not None and p95 > limit:
+                    flag = "  ✗ 超過門檻"
+                    failures.append(f"{n} {name}: p95 {p95:.1f} ms > {limit} ms")
+                new_thresholds.setdefault(str(n), {})[name] = round(max(p95 * 1.5, 1.0), 1)
+                print(f"{n:7d} {name:14s} {len(samples):4d} {p50:9.1f} {p95:9.1f} "
+                      f"{'-' if limit is None else f'{limit:9.1f}':>9s}{flag}")
+            print(f"{n:7d} Sheets API：讀取 {api['read']} 次 / 寫入 {api['write']} 次 / 注入錯誤 {api['errors']} 次")
+
+    if args.write_thresholds:
+        THRESHOLDS.write_text(json.dumps(new_thresholds, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+        print(f"已更新 {THRESHOLDS.name}")
+    elif failures:
+        print("\n效能回歸：\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""記憶體內的 gspread 替身：涵蓋本系統用到的 API，可注入延遲與配額錯誤 (429)"""
+import datetime
+import random
+import re
+import threading
+import time
+
+import gspread
+
+DEFAULT_GRID_ROWS = 1000
+_RANGE_RE = re.compile(r"^(?:.*!)?([A-Z]+)?(\d+)?(?::([A-Z]+)?(\d+)?)?$")
+
+
+HEADER = ["時間", "場站", "姓名", "電話", "車號", "類別", "描述", "填單人"]
+STATIONS = ["華視光復", "碧華國小", "民生社區", "南港展覽館", "內湖科技園區", "信義廣場", "大安森林", "士林夜市"]
+CATEGORIES = ["發票問題無法繳費", "網路問題無法繳費", "發票缺紙或卡紙", "無法找零", "身障優惠折抵", "網路異常", "繳費問題相關", "其他"]
+STAFF = ["宗哲", "美妞", "政宏", "文輝", "恩佳", "志榮"]
+DESCRIPTIONS = ["客戶反映繳費機無法列印發票", "遠端重新開機後恢復", "車牌辨識錯誤，人工開閘",
+                "現金找零不足，請主管補幣", "身障證明折抵後金額有誤", "網路中斷約十分鐘"]
+
+
+def make_history(n, seed=0, end=None, per_hour=6.0):
+    """產生 n 筆合成案件 (含標題列)，時間由舊到新、最後一筆接近 end (預設為現在)"""
+    rng = random.Random(seed)
+    end = end or datetime.datetime.now()
+    t = end - datetime.timedelta(hours=n / per_hour)
+    rows = [list(HEADER)]
+    for i in range(n):
+        t += datetime.timedelta(hours=rng.expovariate(per_hour))
+        letters = "".join(rng.choice("ABCDEFGHJKLMNPQRSTUVWXYZ") for _ in range(3))
+        rows.append([
+            t.strftime("%Y-%m-%d %H:%M"), rng.choice(STATIONS), f"客戶{i % 997}",
+            f"09{rng.randrange(10 ** 8):08d}", f"{letters}-{rng.randrange(10 ** 4):04d}",
+            rng.choice(CATEGORIES), f"{rng.choice(DESCRIPTIONS)} #{i}", rng.choice(STAFF),
+        ])
+    return rows
+
+
+class FakeQuotaError(Exception):
+    """模擬 Sheets API 的 429 (寫入佇列依 .code 判斷是否重試)"""
+    code = 429
+
+
+def _col_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n
+
+
+class FakeClient:
+    """取代 gspread Client。每個 API 呼叫都經過 request()，因此 SheetsPool 的計數器也能運作。
+
+    latency_ms：每次呼叫的平均延遲 (±50% 抖動)
+    error_rate：每次呼叫回傳 FakeQuotaError 的機率 (write_errors_only 時只影響寫入)
+    """
+
+    def __init__(self, latency_ms=0.0, error_rate=0.0, write_errors_only=False, seed=0):
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.write_errors_only = write_errors_only
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._spreadsheets = {}
+        self.calls = {"read": 0, "write": 0, "errors": 0}
+
+    def request(self, method, endpoint="", **kwargs):
+        kind = "read" if method == "get" else "write"
+        with self._lock:
+            self.calls[kind] += 1
+            fail = self._rng.random() < self.error_rate and not (self.write_errors_only and kind == "read")
+            delay = self.latency_ms * (0.5 + self._rng.random()) / 1000 if self.latency_ms else 0
+        if delay:
+            time.sleep(delay)
+        if fail:
+            with self._lock:
+                self.calls["errors"] += 1
+            raise FakeQuotaError(f"429 RESOURCE_EXHAUSTED ({endpoint})")
+
+    def create(self, title, rows=None):
+        sh = FakeSpreadsheet(self, title)
+        ws = sh._worksheets[0]
+        ws._rows = [list(r) for r in rows or []]
+        ws._grid_rows = max(ws._grid_rows, len(ws._rows))
+        self._spreadsheets[title] = sh
+        return sh
+
+    def open(self, title):
+        self.request("get", "drive.files.list")
+        try:
+            return self._spreadsheets[title]
+        except KeyError:
+            raise gspread.SpreadsheetNotFound(title)
+
+
+class FakeSpreadsheet:
+    def __init__(self, client, title):
+        self.client = client
+        self.title = title
+        self._worksheets = [FakeWorksheet(client, "工作表1")]
+
+    @property
+    def sheet1(self):
+        self.client.request("get", "spreadsheets.get")
+        return self._worksheets[0]
+
+    def worksheet(self, title):
+        self.client.request("get", "spreadsheets.get")
+        for ws in self._worksheets:
+            if ws.title == title:
+                return ws
+        raise gspread.WorksheetNotFound(title)
+
+    def worksheets(self):
+        self.client.request("get", "spreadsheets.get")
+        return list(self._worksheets)
+
+    def add_worksheet(self, title, rows, cols):
+        self.client.request("post", "spreadsheets.batchUpdate")
+        ws = FakeWorksheet(self.client, title, int(rows))
+        self._worksheets.append(ws)
+        return ws
+
+
+class FakeWorksheet:
+    def __init__(self, client, title, rows=DEFAULT_GRID_ROWS):
+        self.client = client
+        self.title = title
+        self._rows = []
+        self._grid_rows = rows     # 工作表格線大小，與資料列數無關 (新工作表預設 1000 列)
+        self._lock = threading.Lock()
+
+    @property
+    def row_count(self):
+        """與 gspread 相同：回傳格線列數 (含空白列)，不是資料列數"""
+        return self._grid_rows
+
+    def _grow(self):
+        self._grid_rows = max(self._grid_rows, len(self._rows))
+
+    # --- 讀取 ---
+    def _slice(self, rng):
+        m = _RANGE_RE.match(rng)
+        c1, r1, c2, r2 = m.groups()
+        start = int(r1) if r1 else 1
+        end = int(r2) if r2 else len(self._rows)
+        first = _col_index(c1) - 1 if c1 else 0
+        last = _col_index(c2) if c2 else None
+        out = [list(r[first:last]) for r in self._rows[start - 1:end]]
+        while out and not any(out[-1]):
+            out.pop()  # 與 API 相同：不回傳結尾的空白列
+        return out
+
+    def get_all_values(self):
+        self.client.request("get", "values.get")
+        with self._lock:
+            width = max((len(r) for r in self._rows), default=0)
+            return [list(r) + [""] * (width - len(r)) for r in self._rows]
+
+    def get(self, range_name):
+        # 與 gspread 相同：空範圍回傳 [[]] 而不是 []
+        self.client.request("get", "values.get")
+        with self._lock:
+            return self._slice(range_name) or [[]]
+
+    def batch_get(self, ranges):
+        self.client.request("get", "values.batchGet")
+        with self._lock:
+            return [self._slice(r) or [[]] for r in ranges]
+
+    def col_values(self, col):
+        self.client.request("get", "values.get")
+        with self._lock:
+            return [r[col - 1] if len(r) >= col else "" for r in self._rows]
+
+    # --- 寫入 ---
+    def _range_reply(self, start, count, width):
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:{chr(64 + max(width, 1))}{start + count - 1}"}}
+
+    def append_row(self, values, **kwargs):
+        return self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        self.client.request("post", "values.append")
+        with self._lock:
+            start = len(self._rows) + 1
+            self._rows.extend(list(v) for v in values)
+            self._grow()
+            return self._range_reply(start, len(values), max(len(v) for v in values))
+
+    def update(self, range_name, values=None, **kwargs):
+        if not isinstance(range_name, str):  # gspread 6 的參數順序 update(values, range_name)
+            range_name, values = values, range_name
+        self.client.request("put", "values.update")
+        with self._lock:
+            self._write(range_name, values)
+
+    def batch_update(self, data, **kwargs):
+        self.client.request("post", "values.batchUpdate")
+        with self._lock:
+            for d in data:
+                self._write(d["range"], d["values"])
+
+    def delete_rows(self, start_index, end_index=None):
+        self.client.request("post", "spreadsheets.batchUpdate")
+        with self._lock:
+            end = end_index or start_index
+            del self._rows[start_index - 1:end]
+            self._grid_rows -= end - start_index + 1
+
+    def _write(self, rng, values):
+        m = _RANGE_RE.match(rng)
+        row = int(m.group(2))
+        for i, v in enumerate(values):
+            idx = row - 1 + i
+            while len(self._rows) <= idx:
+                self._rows.append([])
+            self._rows[idx] = list(v)
+        self._grow()
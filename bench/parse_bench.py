@@ -0,0 +1,40 @@
+"""停車場頁面解析基準測試：對 bench/fixtures 中保存的頁面量測每頁解析時間
+
+    python bench/parse_bench.py [--number 200]
+"""
+import argparse
+import pathlib
+import sys
+import timeit
+
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parent.parent))
+import parking_parser  # noqa: E402
+from parking_parser import PARSERS, parse_spots  # noqa: E402
+
+FIXTURES = pathlib.Path(__file__).resolve().parent / "fixtures"
+
+
+def bench(fn, body, number):
+    return timeit.timeit(lambda: fn(body), number=number) / number * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--number", type=int, default=200, help="每個頁面重複解析的次數")
+    args = ap.parse_args()
+
+    if parking_parser.lxml_html is None:
+        print("※ 未安裝 lxml，xpath 層略過")
+    if parking_parser.BeautifulSoup is None:
+        print("※ 未安裝 beautifulsoup4，dom 層略過")
+    print(f"{'fixture':28s} {'來源':6s} {'車位':>5s} {'總計 µs':>10s}   各層 µs")
+    for path in sorted(FIXTURES.glob("realtime_*")):
+        body = path.read_bytes()
+        r = parse_spots(body)
+        layers = "  ".join(f"{p.__name__[6:]}={bench(p, body, args.number):.1f}" for p in PARSERS)
+        spots = "-" if r.spots is None else r.spots
+        print(f"{path.name:28s} {r.source:6s} {spots!s:>5s} {bench(parse_spots, body, args.number):10.1f}   {layers}")
+
+
+if __name__ == "__main__":
+    main()
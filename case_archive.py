@@ -0,0 +1,254 @@
+"""歷史案件封存 (冷熱分離)：已結束的月份移到「封存_YYYY-MM」工作表，sheet1 只保留最近 HOT_MONTHS 個月。
+
+封存月份不再變動，網頁端各月份只下載一次並快取成本地 Parquet；搜尋與統計透過 CaseArchive
+同時查詢熱資料與封存資料。
+
+    python case_archive.py [--hot-months 2] [--dry-run]   # 建議於離峰時段執行
+"""
+import argparse
+import datetime
+import glob
+import os
+import sys
+import threading
+import time
+
+import pandas as pd
+
+import perf
+from case_store import col_letter
+from case_table import ROW_COL, build_case_table, date_slice
+from search_index import SearchIndex
+from stats_cube import StatsCube, parse_day
+
+SHEET_NAME = "客服作業表"
+ARCHIVE_PREFIX = "封存_"
+# 封存工作表所在的試算表；預設與作業表相同，可指向另一份試算表以避開單一試算表的儲存格上限
+ARCHIVE_SPREADSHEET = os.environ.get("CASE_ARCHIVE_SPREADSHEET", SHEET_NAME)
+ARCHIVE_DIR = os.environ.get("CASE_ARCHIVE_DIR", "case_archive")
+HOT_MONTHS = 2           # sheet1 保留的月份數 (含本月)
+CHECK_INTERVAL = 600     # 秒：網頁端檢查是否有新封存月份的間隔
+
+
+class ArchiveChanged(RuntimeError):
+    """封存期間 sheet1 開頭的列有變動 (其他人編輯或刪除)，已中止刪除"""
+
+
+def hot_cutoff(today=None, hot_months=HOT_MONTHS):
+    """熱資料的起始日 (本月往前 hot_months - 1 個月的 1 號)"""
+    today = today or datetime.date.today()
+    m = today.year * 12 + today.month - 1 - (hot_months - 1)
+    return datetime.date(m // 12, m % 12 + 1, 1)
+
+
+def archivable_prefix(rows, cutoff):
+    """sheet1 開頭 (標題之後) 連續、日期早於 cutoff 的列數。
+
+    只封存開頭連續的一段，刪除後其餘列號一律往前位移相同列數；
+    遇到空白、無法解析或較新的日期即停止，這些列留在熱資料中等下次封存。
+    """
+    n = 0
+    for r in rows[1:]:
+        day = parse_day(r[0]) if r else None
+        if day is None or day >= cutoff:
+            break
+        n += 1
+    return n
+
+
+def archive_closed_months(pool, title=SHEET_NAME, hot_months=HOT_MONTHS, archive_title=ARCHIVE_SPREADSHEET,
+                          today=None, dry_run=False):
+    """把 sheet1 開頭已結束月份的案件搬到各月份的封存工作表，回傳 {月份: 筆數}。
+
+    先寫入封存工作表、確認後才刪除 sheet1 的列；中途失敗重跑時不會重複寫入 (比對封存表尾端)。
+    刪除前重新讀取要刪除的範圍，內容與一開始讀到的不同時丟出 ArchiveChanged，不刪除任何列。
+    """
+    ws = pool.worksheet(title)
+    rows = ws.get_all_values()
+    n = archivable_prefix(rows, hot_cutoff(today, hot_months))
+    if not n:
+        return {}
+    header = rows[0]
+    width = len(header)
+    last = col_letter(width)
+
+    prefix = [[str(c) for c in r[:width]] + [""] * (width - len(r)) for r in rows[1:n + 1]]
+    periods = {}
+    for r in prefix:
+        periods.setdefault(parse_day(r[0]).strftime("%Y-%m"), []).append(r)
+    if dry_run:
+        return {p: len(chunk) for p, chunk in periods.items()}
+
+    for period, chunk in periods.items():
+        created = []
+
+        def create(sh):
+            aws = sh.add_worksheet(title=ARCHIVE_PREFIX + period, rows=len(chunk) + 1, cols=width)
+            aws.batch_update([{"range": f"A1:{last}{len(chunk) + 1}", "values": [header] + chunk}])
+            created.append(aws)
+            return aws
+
+        with perf.span("archive.write", period=period):
+            aws = pool.worksheet(archive_title, ARCHIVE_PREFIX + period, create=create)
+            if not created:
+                existing = [r + [""] * (width - len(r)) for r in aws.get_all_values()]
+                if existing[-len(chunk):] != chunk:
+                    aws.append_rows(chunk)
+    with perf.span("archive.delete_rows"):
+        current = [[str(c) for c in r[:width]] + [""] * (width - len(r)) for r in ws.get(f"A2:{last}{n + 1}")]
+        if current != prefix:
+            raise ArchiveChanged(f"封存期間作業表第 2~{n + 1} 列有變動，已中止刪除，請重新執行封存")
+        ws.delete_rows(2, n + 1)
+    return {p: len(chunk) for p, chunk in periods.items()}
+
+
+class CaseArchive:
+    """封存資料的唯讀查詢：全文搜尋、統計立方體、日期區間資料表。
+
+    - check() 由背景執行緒 (ChangeFeed) 呼叫，每 CHECK_INTERVAL 秒 (或 refresh() 後) 以一次 metadata
+      請求列出封存工作表；periods() 只讀取快取，rerun 中不會發出網路請求
+    - 各月份以 (月份, 列數) 為鍵快取成 ARCHIVE_DIR 下的 Parquet，之後只讀本地檔
+    - 搜尋索引與立方體在第一次查詢時才建立，有新封存月份時重建
+    - 下載、寫入 Parquet 與建立衍生資料時只持有 _build_lock，_lock 只在讀取 / 發布結果時短暫持有，
+      背景的 check() 與案件同步不會被第一次的封存查詢卡住
+    """
+
+    def __init__(self, pool, title=ARCHIVE_SPREADSHEET, directory=ARCHIVE_DIR, normalize_plate=None, exclude=("其他",)):
+        self._pool = pool
+        self._title = title
+        self._dir = directory
+        self._normalize_plate = normalize_plate
+        self._exclude = exclude
+        self._lock = threading.RLock()         # 月份清單與已建立的衍生資料
+        self._build_lock = threading.RLock()   # 同一時間只有一個下載 / 建立在進行
+        self._periods = None
+        self._checked = float("-inf")
+        self._rows = self._index = self._cube = None
+        self.version = 0
+
+    def refresh(self):
+        """下次 check() 時重新檢查封存工作表清單"""
+        with self._lock:
+            self._checked = float("-inf")
+
+    def check(self):
+        """距上次檢查超過 CHECK_INTERVAL 秒時列出封存工作表並更新月份清單 (網路請求期間不持有鎖)"""
+        if time.monotonic() - self._checked < CHECK_INTERVAL:
+            return
+        sh = self._pool.spreadsheet(self._title)
+        with perf.span("archive.list"):
+            found = {ws.title[len(ARCHIVE_PREFIX):]: ws.row_count
+                     for ws in sh.worksheets() if ws.title.startswith(ARCHIVE_PREFIX)}
+        with self._lock:
+            self._checked = time.monotonic()
+            if found != self._periods:
+                self._periods = found
+                self._rows = self._index = self._cube = None
+                self.version += 1
+
+    def periods(self):
+        """{月份: 工作表列數}；只讀取最近一次 check() 的結果 (尚未檢查過為空)"""
+        with self._lock:
+            return self._periods or {}
+
+    def _frame(self, period, row_count):
+        path = os.path.join(self._dir, f"{period}_{row_count}.parquet")
+        with self._build_lock:
+            if os.path.exists(path):
+                return pd.read_parquet(path)
+            with perf.span("archive.download", period=period):
+                rows = self._pool.worksheet(self._title, ARCHIVE_PREFIX + period).get_all_values()
+            if not rows:
+                return pd.DataFrame()
+            df = pd.DataFrame(rows[1:], columns=rows[0])
+            os.makedirs(self._dir, exist_ok=True)
+            for stale in glob.glob(os.path.join(self._dir, f"{period}_*.parquet")):
+                os.remove(stale)
+            df.to_parquet(path, index=False)
+            return df
+
+    def _frames(self, first=None, last=None):
+        periods = self.periods()
+        lo = first.strftime("%Y-%m") if first else ""
+        hi = last.strftime("%Y-%m") if last else "9999-99"
+        return [self._frame(p, n) for p, n in sorted(periods.items()) if lo <= p <= hi]
+
+    def _derived(self, name, build):
+        """回傳快取的衍生資料；尚未建立時在 _lock 之外建立，月份清單在建立期間沒有變動才發布"""
+        with self._lock:
+            value = getattr(self, name)
+        if value is not None:
+            return value
+        with self._build_lock:
+            with self._lock:
+                value, version = getattr(self, name), self.version
+            if value is None:
+                value = build()
+                with self._lock:
+                    if self.version == version:
+                        setattr(self, name, value)
+        return value
+
+    def _build_rows(self):
+        frames = [f for f in self._frames() if not f.empty]
+        return [list(frames[0].columns)] + [r for f in frames for r in f.values.tolist()] if frames else []
+
+    def _build_index(self):
+        rows = self.rows()
+        index = SearchIndex(normalize_plate=self._normalize_plate)
+        index.reset(rows)
+        return rows, index
+
+    def _build_cube(self):
+        cube = StatsCube(exclude=self._exclude)
+        cube.reset(self.rows())
+        return cube
+
+    def rows(self):
+        """所有封存案件 (含標題列，依月份排序)"""
+        return self._derived("_rows", self._build_rows)
+
+    def search(self, query):
+        """回傳符合的封存案件列 (依月份、列序)"""
+        rows, index = self._derived("_index", self._build_index)   # 索引與建立它的資料列成對保存
+        return [rows[i - 1] for i in index.search(query)]
+
+    def cube(self):
+        """封存案件的每日統計立方體 (可與熱資料的立方體以 CombinedCube 合併查詢)"""
+        return self._derived("_cube", self._build_cube)
+
+    def date_slice(self, first, last):
+        """日期介於 first ~ last (含) 的封存案件資料表 (欄位與 build_case_table 相同，ROW_COL 為 0)"""
+        frames = [f for f in self._frames(first, last) if not f.empty]
+        if not frames:
+            return None
+        df = pd.concat(frames, ignore_index=True)
+        table = build_case_table([list(df.columns)] + df.values.tolist())
+        table[ROW_COL] = 0
+        return date_slice(table, first, last)
+
+
+def main():
+    from oauth2client.service_account import ServiceAccountCredentials
+    from sheets_client import SCOPE, SheetsPool
+
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hot-months", type=int, default=HOT_MONTHS, help="sheet1 保留的月份數 (含本月)")
+    ap.add_argument("--keyfile", default="service_account.json")
+    ap.add_argument("--dry-run", action="store_true", help="只列出會封存的月份與筆數")
+    args = ap.parse_args()
+
+    creds = ServiceAccountCredentials.from_json_keyfile_name(args.keyfile, SCOPE)
+    pool = SheetsPool(creds)
+    try:
+        done = archive_closed_months(pool, hot_months=args.hot_months, dry_run=args.dry_run)
+    except ArchiveChanged as e:
+        sys.exit(f"❌ {e}")
+    for period, n in done.items():
+        print(f"{'[dry-run] ' if args.dry_run else ''}{ARCHIVE_PREFIX}{period}：{n} 筆")
+    if not done:
+        print("沒有需要封存的月份")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""客服作業表 sheet1 的本地資料列快取：只抓新增列，定期以檢查碼比對漂移"""
+import hashlib
+import re
+import threading
+import time
+
+import perf
+
+# --- 同步參數 ---
+DELTA_INTERVAL = 20      # 秒：距上次同步超過此時間才抓取新增列
+VERIFY_INTERVAL = 120    # 秒：尾端 + 輪替區段檢查碼比對週期
+VERIFY_TAIL = 200        # 每次比對的尾端列數 (最常被編輯的近期資料)
+VERIFY_CHUNK = 2000      # 每次比對的輪替區段列數 (涵蓋外部編輯的舊資料)
+DEFAULT_WIDTH = 8        # A:H 八個欄位
+
+
+def col_letter(n):
+    """欄位序號轉 A1 欄名 (1 -> A, 27 -> AA)"""
+    s = ""
+    while n:
+        n, r = divmod(n - 1, 26)
+        s = chr(65 + r) + s
+    return s
+
+
+def checksum(rows):
+    h = hashlib.blake2b(digest_size=16)
+    for r in rows:
+        h.update("\x1f".join(r).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+def trim_blank(rows):
+    """去掉結尾的空白列：gspread 對空範圍回傳 [[]] 而不是 []"""
+    rows = list(rows)
+    while rows and not any(str(c).strip() for c in rows[-1]):
+        rows.pop()
+    return rows
+
+
+def parse_updated_row(resp):
+    """從 append_row(s) 的回應 (updates.updatedRange) 取出實際寫入的起始列號"""
+    try:
+        rng = resp["updates"]["updatedRange"]
+    except (KeyError, TypeError):
+        return None
+    m = re.search(r"![A-Z]+(\d+)", rng)
+    return int(m.group(1)) if m else None
+
+
+class CaseStore:
+    """sheet1 的本地列存放區 (含標題列)；列號 = 索引 + 1，與 Google Sheets 一致。
+
+    - 首次讀取做一次 get_all_values() 全量載入
+    - 之後每 DELTA_INTERVAL 秒只抓取目前列數之後的新增列
+    - 透過本系統 update/append 的資料直接就地修補，不需重新下載
+    - 每 VERIFY_INTERVAL 秒以 batch_get 一次讀取尾端與一段輪替區段比對檢查碼，
+      外部編輯最遲在 (總列數 / VERIFY_CHUNK) 個比對週期內被發現；
+      只有在檢查碼或列數不符時才全量重載
+    - 觀察者 (搜尋索引等) 會收到 reset(rows) / extend(start, rows) / patch(idx, old, new)
+      通知以增量維護衍生資料
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()        # 資料列與觀察者
+        self._sync_lock = threading.Lock()    # 同一時間只有一個同步在進行
+        self._rows = []
+        self._width = DEFAULT_WIDTH
+        self._loaded = False
+        self._last_delta = 0.0
+        self._last_verify = 0.0
+        self._cursor = 2
+        self.version = 0
+        self.stats = {"full": 0, "delta": 0, "verify": 0, "drift": 0}
+        self._observers = []
+
+    def _norm(self, r):
+        r = [str(c) for c in r[:self._width]]
+        return r + [""] * (self._width - len(r))
+
+    def _bump(self):
+        self.version += 1
+
+    def add_observer(self, obs):
+        """註冊觀察者；已載入資料時立即以目前的列初始化"""
+        with self._lock:
+            self._observers.append(obs)
+            if self._loaded:
+                obs.reset(self._rows)
+
+    def _extend(self, rows):
+        start = len(self._rows) + 1
+        rows = [self._norm(r) for r in rows]
+        self._rows.extend(rows)
+        for obs in self._observers:
+            obs.extend(start, rows)
+        self._bump()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def current(self):
+        """目前的 (資料版本, 資料列)，不做任何同步 (由 ChangeFeed 背景執行緒負責同步)"""
+        with self._lock:
+            return self.version, list(self._rows)
+
+    def snapshot(self, ws):
+        """回傳目前資料列 (list of list，含標題)，必要時先同步"""
+        return self.versioned_snapshot(ws)[1]
+
+    def versioned_snapshot(self, ws):
+        """回傳 (資料版本, 資料列)；版本號可作為衍生資料 (型別化資料表等) 的快取鍵"""
+        self.sync(ws)
+        return self.current()
+
+    def sync(self, ws, delta_interval=DELTA_INTERVAL):
+        """依排程執行一次同步 (全量載入 / 檢查碼比對 / 抓取新增列)，回傳資料版本。
+
+        網路請求期間只持有同步鎖，讀取端 (current) 不會被阻擋；
+        請求期間本地資料若有變動 (本系統寫入)，該次結果捨棄，下次同步再處理。
+        """
+        with self._sync_lock:
+            now = time.monotonic()
+            if not self._loaded:
+                self._full_reload(ws)
+            elif now - self._last_verify >= VERIFY_INTERVAL:
+                self._verify(ws)
+            elif now - self._last_delta >= delta_interval:
+                self._delta(ws)
+        return self.version
+
+    def invalidate(self):
+        """下次讀取時強制全量重載"""
+        with self._lock:
+            self._loaded = False
+
+    def request_verify(self):
+        """下次同步時立即比對檢查碼 (只有偵測到不一致才全量重載)"""
+        with self._lock:
+            self._last_verify = float("-inf")
+
+    def _full_reload(self, ws):
+        with perf.span("cases.full_reload"):
+            rows = ws.get_all_values()
+        with self._lock:
+            self._width = len(rows[0]) if rows and rows[0] else DEFAULT_WIDTH
+            rows = [self._norm(r) for r in rows]
+            changed = rows != self._rows
+            self._rows = rows
+            self._loaded = True
+            self._cursor = 2
+            self._last_delta = self._last_verify = time.monotonic()
+            self.stats["full"] += 1
+            if changed:  # 內容相同的重載不推進版本號，衍生資料不必重建
+                for obs in self._observers:
+                    obs.reset(self._rows)
+                self._bump()
+
+    def _append_fetched(self, fetched):
+        # 只有真的有新增列時才附加並推進版本號，沒有新資料的輪詢不影響衍生資料的快取
+        fetched = trim_blank(fetched)
+        if fetched:
+            self._extend(fetched)
+
+    def _delta(self, ws):
+        with self._lock:
+            n = len(self._rows)
+        with perf.span("cases.delta"):
+            fetched = ws.get(f"A{n + 1}:{col_letter(self._width)}")
+        with self._lock:
+            if len(self._rows) == n:
+                self._append_fetched(fetched)
+            self._last_delta = time.monotonic()
+            self.stats["delta"] += 1
+
+    def _verify(self, ws):
+        with self._lock:
+            n, version = len(self._rows), self.version
+            last = col_letter(self._width)
+            tail_start = max(2, n - VERIFY_TAIL + 1)
+            ranges = [f"A{tail_start}:{last}"]
+            chunk_end = min(self._cursor + VERIFY_CHUNK - 1, tail_start - 1)
+            if self._cursor <= chunk_end:
+                ranges.append(f"A{self._cursor}:{last}{chunk_end}")
+        with perf.span("cases.verify"):
+            fetched = ws.batch_get(ranges)
+        with self._lock:
+            if self.version != version or not self._loaded:
+                return  # 比對期間本地資料已變動，下次同步重新比對
+            self._last_delta = self._last_verify = time.monotonic()
+            self.stats["verify"] += 1
+
+            tail = [self._norm(r) for r in trim_blank(fetched[0])]
+            local_tail = self._rows[tail_start - 1:]
+            drift = len(tail) < len(local_tail) or \
+                checksum(tail[:len(local_tail)]) != checksum(local_tail)
+            if not drift and len(ranges) > 1:
+                expected = chunk_end - self._cursor + 1
+                chunk = [self._norm(r) for r in fetched[1]]
+                chunk += [self._norm([])] * (expected - len(chunk))
+                drift = checksum(chunk) != checksum(self._rows[self._cursor - 1:chunk_end])
+            if not drift:
+                self._append_fetched(tail[len(local_tail):])
+                self._cursor = chunk_end + 1 if chunk_end + 1 < tail_start else 2
+                return
+            self.stats["drift"] += 1
+            perf.incr("cases.drift")
+        self._full_reload(ws)
+
+    def record_appends(self, rows, resp=None):
+        """本系統 append_rows 成功後呼叫：起始列號剛好銜接就直接附加，否則下次讀取補抓新增列"""
+        with self._lock:
+            if self._loaded and parse_updated_row(resp) == len(self._rows) + 1:
+                self._extend(rows)
+            else:
+                self._last_delta = 0.0
+
+    def find(self, row):
+        """回傳內容與 row 相同的第一個列號 (封存刪除前段列後，用來找回被編輯案件的新位置)"""
+        target = self._norm(row)
+        with self._lock:
+            for i, r in enumerate(self._rows[1:], start=2):
+                if r == target:
+                    return i
+        return None
+
+    def matches(self, row_idx, rows):
+        """第 row_idx 列的內容是否為 rows 其中之一"""
+        with self._lock:
+            if not 1 <= row_idx <= len(self._rows):
+                return False
+            return self._rows[row_idx - 1] in [self._norm(r) for r in rows]
+
+    def patch(self, row_idx, row, expected=None):
+        """本系統 update 成功後呼叫：就地修補第 row_idx 列 (有 expected 時，只在原內容相符時修補)"""
+        with self._lock:
+            if expected is not None and not self.matches(row_idx, [expected]):
+                return
+            if self._loaded and 1 <= row_idx <= len(self._rows):
+                old, new = self._rows[row_idx - 1], self._norm(row)
+                if old == new:
+                    return  # 樂觀更新後寫入成功的第二次修補
+                self._rows[row_idx - 1] = new
+                for obs in self._observers:
+                    obs.patch(row_idx, old, new)
+                self._bump()
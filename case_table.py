@@ -0,0 +1,45 @@
+"""案件型別化欄式資料表：每個資料版本只解析一次日期，兩個分頁共用"""
+import datetime
+import numpy as np
+import pandas as pd
+
+ROW_COL = "_row"                 # 對應 Google Sheets 的列號
+CATEGORY_COLS = (1, 5, 7)        # 場站、類別、填單人 -> category 型別
+
+
+def build_case_table(rows):
+    """由原始列 (含標題) 建立依時間排序的 DataFrame。
+
+    - 第 1 欄解析為 datetime64，無法解析的列捨棄 (與原本 to_datetime 的 except 行為一致)
+    - 場站 / 類別 / 填單人轉為 category，ROW_COL 保存原始 sheet 列號供編輯使用
+    """
+    hdr = rows[0]
+    df = pd.DataFrame(rows[1:], columns=hdr)
+    df[ROW_COL] = np.arange(2, len(rows) + 1, dtype="int32")
+    ts = pd.to_datetime(df[hdr[0]], errors="coerce", format="mixed")
+    if getattr(ts.dt, "tz", None) is not None:
+        ts = ts.dt.tz_localize(None)
+    df[hdr[0]] = ts
+    df = df.dropna(subset=[hdr[0]])
+    for i in CATEGORY_COLS:
+        if i < len(hdr):
+            df[hdr[i]] = df[hdr[i]].astype("category")
+    return df.sort_values(hdr[0], kind="mergesort").reset_index(drop=True)
+
+
+def time_slice(table, start=None, end=None):
+    """以二分搜尋取出 start <= 時間 < end 的列 (table 已依時間排序)"""
+    ts = table[table.columns[0]].values
+    lo = ts.searchsorted(pd.Timestamp(start).to_datetime64()) if start is not None else 0
+    hi = ts.searchsorted(pd.Timestamp(end).to_datetime64()) if end is not None else len(ts)
+    return table.iloc[lo:hi]
+
+
+def date_slice(table, first, last):
+    """取出日期介於 first ~ last (含) 的列"""
+    return time_slice(table, first, last + datetime.timedelta(days=1))
+
+
+def memory_footprint(table):
+    """資料表實際佔用記憶體 (bytes，含字串內容)"""
+    return int(table.memory_usage(deep=True).sum())
@@ -0,0 +1,80 @@
+"""全程序共用的案件變更來源：單一背景執行緒定期同步 CaseStore，各 session 只讀取記憶體中的資料"""
+import threading
+import time
+
+import perf
+
+FEED_INTERVAL = 5        # 秒：抓取新增列的間隔 (每次一個 values.get，沒有新資料時回應為空)
+MAX_BACKOFF = 60         # 秒：同步失敗時的重試間隔上限
+
+
+class ChangeFeed:
+    """包裝 CaseStore 的同步排程。
+
+    - 背景執行緒每 FEED_INTERVAL 秒呼叫 store.sync()：平時只抓新增列，每 VERIFY_INTERVAL 秒
+      比對檢查碼，偵測到外部編輯才全量重載；Sheets 讀取次數與開啟的 session 數量無關
+    - snapshot() 只回傳記憶體中的 (版本, 資料列)，尚未載入時才由呼叫端同步載入一次
+    - poll_now() 喚醒背景執行緒立即比對 (取代原本的全量重載刷新)
+    - 同步失敗 (例如 429) 保留舊資料並以指數退避重試
+    - add_task() 註冊的背景工作 (例如封存月份清單) 在每次同步後執行，rerun 只讀取其結果
+    """
+
+    def __init__(self, store, ws_getter, interval=FEED_INTERVAL, start=True):
+        self._store = store
+        self._ws_getter = ws_getter
+        self._interval = interval
+        self._wake = threading.Event()
+        self._backoff = 0
+        self.last_error = None
+        self.last_sync = None
+        self.stats = {"poll": 0, "error": 0}
+        self._tasks = []
+        if start:
+            threading.Thread(target=self._run, name="change-feed", daemon=True).start()
+
+    def snapshot(self):
+        """目前的 (資料版本, 資料列)；第一次呼叫時同步載入"""
+        if not self._store.loaded:
+            self._store.sync(self._ws_getter())
+        return self._store.current()
+
+    def add_task(self, fn):
+        """每次同步後在背景執行緒呼叫 fn() (由 fn 自行決定間隔)；失敗不影響案件同步"""
+        self._tasks.append(fn)
+
+    def _run_tasks(self):
+        for fn in list(self._tasks):
+            try:
+                fn()
+            except Exception:
+                perf.incr("feed.task_error")   # 下次同步後再試
+
+    def poll_now(self):
+        self._store.request_verify()
+        self._wake.set()
+
+    def poll(self):
+        """同步一次"""
+        with perf.span("feed.poll"):
+            self._store.sync(self._ws_getter(), delta_interval=0)
+        self.stats["poll"] += 1
+        self.last_sync = time.time()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self._backoff or self._interval)
+            self._wake.clear()
+            try:
+                self.poll()
+                self._backoff = 0
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                self.stats["error"] += 1
+                perf.incr("feed.error")
+                self._backoff = min(MAX_BACKOFF, (self._backoff or self._interval) * 2)
+            self._run_tasks()
+
+    def age(self):
+        """距離最近一次成功同步的秒數 (尚未同步過為 None)"""
+        return None if self.last_sync is None else time.time() - self.last_sync
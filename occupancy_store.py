@@ -0,0 +1,97 @@
+"""停車場車位時間序列：SQLite 追加寫入，支援區間查詢與每小時 / 每日降採樣"""
+import contextlib
+import datetime
+import os
+import sqlite3
+import time
+
+DB_FILE = os.environ.get("OCCUPANCY_DB", "occupancy.db")
+TZ_OFFSET = 8 * 3600     # 台北時間固定 UTC+8 (無日光節約)，分桶時以當地時間切齊
+BUCKETS = {"hour": 3600, "day": 86400}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id       INTEGER PRIMARY KEY,
+    ts       INTEGER NOT NULL,          -- Unix 秒 (UTC)
+    lot      TEXT    NOT NULL,
+    spots    INTEGER,                   -- 解析失敗為 NULL
+    error    TEXT,
+    mirrored INTEGER NOT NULL DEFAULT 0 -- 是否已同步到 Google Sheets
+);
+CREATE INDEX IF NOT EXISTS idx_readings_lot_ts ON readings (lot, ts);
+CREATE INDEX IF NOT EXISTS idx_readings_ts ON readings (ts);
+CREATE INDEX IF NOT EXISTS idx_readings_pending ON readings (id) WHERE mirrored = 0;
+"""
+
+
+def to_epoch(dt):
+    """datetime / date -> Unix 秒；naive 時間視為台北時間"""
+    if isinstance(dt, (int, float)):
+        return int(dt)
+    if not isinstance(dt, datetime.datetime):
+        dt = datetime.datetime.combine(dt, datetime.time())
+    if dt.tzinfo is None:
+        return int(dt.replace(tzinfo=datetime.timezone.utc).timestamp()) - TZ_OFFSET
+    return int(dt.timestamp())
+
+
+def from_epoch(ts):
+    """Unix 秒 -> 台北時間 (naive datetime)"""
+    return datetime.datetime.fromtimestamp(ts + TZ_OFFSET, datetime.timezone.utc).replace(tzinfo=None)
+
+
+class OccupancyStore:
+    """append-only 車位讀數。poller 先寫入本地，再以 pending_mirror / mark_mirrored 批次鏡像到 Sheets。"""
+
+    def __init__(self, path=DB_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # WAL 讓網頁端讀取時不阻擋 poller 寫入；離開時提交並關閉連線
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def append(self, readings, ts=None):
+        """readings: [(停車場, SpotReading), ...]，同一輪共用同一時間戳"""
+        ts = int(time.time()) if ts is None else to_epoch(ts)
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO readings (ts, lot, spots, error) VALUES (?, ?, ?, ?)",
+                [(ts, lot, r.spots, r.error) for lot, r in readings])
+
+    def pending_mirror(self, limit=5000):
+        """尚未同步到 Sheets 的讀數 [(id, ts, lot, spots, error), ...]"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT id, ts, lot, spots, error FROM readings WHERE mirrored = 0 ORDER BY id LIMIT ?",
+                (limit,)).fetchall()
+
+    def mark_mirrored(self, ids):
+        with self._connect() as conn:
+            conn.executemany("UPDATE readings SET mirrored = 1 WHERE id = ?", [(i,) for i in ids])
+
+    def lots(self):
+        with self._connect() as conn:
+            return [r[0] for r in conn.execute("SELECT DISTINCT lot FROM readings ORDER BY lot")]
+
+    def downsample(self, start, end, bucket="hour", lot=None):
+        """依當地時間每小時 / 每日分桶：[(桶起點, 停車場, 最小, 平均, 最大, 筆數), ...]，只統計有數值的讀數"""
+        size = BUCKETS[bucket]
+        sql = (f"SELECT ((ts + {TZ_OFFSET}) / {size}) * {size} - {TZ_OFFSET} AS b, lot, "
+               "MIN(spots), AVG(spots), MAX(spots), COUNT(spots) "
+               "FROM readings WHERE ts >= ? AND ts < ? AND spots IS NOT NULL")
+        args = [to_epoch(start), to_epoch(end)]
+        if lot:
+            sql += " AND lot = ?"
+            args.append(lot)
+        with self._connect() as conn:
+            rows = conn.execute(sql + " GROUP BY b, lot ORDER BY b, lot", args).fetchall()
+        return [(from_epoch(b), lot, lo, avg, hi, n) for b, lot, lo, avg, hi, n in rows]
@@ -0,0 +1,123 @@
+"""停車場即時資訊解析：依成本由低到高嘗試 JSON -> 位元組定位 -> lxml XPath -> 完整 DOM"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    from lxml import etree as lxml_etree, html as lxml_html
+except ImportError:  # lxml 為選用套件，缺少時略過 XPath 這一層
+    lxml_etree = lxml_html = None
+try:
+    from bs4 import BeautifulSoup
+except ImportError:
+    BeautifulSoup = None
+
+SPOTS_ID = "ContentPlaceHolder1_lblAvailableCar"
+SPOTS_LABEL = "剩餘車位"
+# JSON / XHR 回應中可能代表剩餘車位的欄位名稱 (小寫比對)
+JSON_KEYS = ("availablecar", "available_car", "availablecars", "available", "surplus", "剩餘車位")
+
+_ID_RE = re.compile(
+    rb"""id\s*=\s*["']""" + SPOTS_ID.encode() + rb"""["'][^>]*>\s*(\d+)\s*<""")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+@dataclass(frozen=True)
+class SpotReading:
+    """剩餘車位解析結果；spots 為 None 時 error 說明原因"""
+    spots: Optional[int]
+    source: str                 # json / bytes / xpath / dom / none / error
+    error: Optional[str] = None
+
+    @property
+    def ok(self):
+        return self.spots is not None
+
+    @classmethod
+    def failed(cls, error, source="error"):
+        return cls(None, source, error)
+
+
+def _from_json(obj):
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            if str(k).lower() in JSON_KEYS and str(v).strip().isdigit():
+                return int(str(v).strip())
+        obj = list(obj.values())
+    if isinstance(obj, list):
+        for v in obj:
+            if isinstance(v, (dict, list)):
+                found = _from_json(v)
+                if found is not None:
+                    return found
+    return None
+
+
+def _near_label(texts):
+    """只在「剩餘車位」標籤本身或緊接的下一段文字中找數字 (不掃描整頁，避免抓到無關數字)"""
+    for i, t in enumerate(texts):
+        if SPOTS_LABEL in t:
+            for candidate in [t.split(SPOTS_LABEL, 1)[1]] + texts[i + 1:i + 2]:
+                m = _DIGITS_RE.search(candidate)
+                if m:
+                    return int(m.group())
+    return None
+
+
+def parse_json(body):
+    s = body.lstrip()[:1]
+    if s not in (b"{", b"["):
+        return None
+    try:
+        spots = _from_json(json.loads(body))
+    except ValueError:
+        return None
+    return SpotReading(spots, "json") if spots is not None else None
+
+
+def parse_bytes(body):
+    m = _ID_RE.search(body)
+    return SpotReading(int(m.group(1)), "bytes") if m else None
+
+
+def parse_xpath(body):
+    if lxml_html is None:
+        return None
+    try:
+        doc = lxml_html.fromstring(body)
+    except (ValueError, TypeError, lxml_etree.LxmlError):  # 空白或無法解析的內容 (ParserError)
+        return None
+    vals = doc.xpath(f"//*[@id='{SPOTS_ID}']/text()")
+    if vals and vals[0].strip().isdigit():
+        return SpotReading(int(vals[0].strip()), "xpath")
+    texts = [t.strip() for t in doc.xpath("//text()") if t.strip()]
+    spots = _near_label(texts)
+    return SpotReading(spots, "xpath") if spots is not None else None
+
+
+def parse_dom(body):
+    if BeautifulSoup is None:
+        return None
+    soup = BeautifulSoup(body, "html.parser")
+    el = soup.find(id=SPOTS_ID)
+    if el and el.get_text(strip=True).isdigit():
+        return SpotReading(int(el.get_text(strip=True)), "dom")
+    spots = _near_label(list(soup.stripped_strings))
+    return SpotReading(spots, "dom") if spots is not None else None
+
+
+PARSERS = (parse_json, parse_bytes, parse_xpath, parse_dom)
+
+
+def parse_spots(body, parsers=PARSERS):
+    """解析回應內容 (bytes 或 str)，依序嘗試各層，全部失敗回傳 spots=None 的結果"""
+    if isinstance(body, str):
+        body = body.encode("utf-8")
+    if not body.strip():
+        return SpotReading.failed("暫無數據", source="none")
+    for parser in parsers:
+        reading = parser(body)
+        if reading is not None:
+            return reading
+    return SpotReading.failed("暫無數據", source="none")
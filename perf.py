@@ -0,0 +1,85 @@
+"""效能量測：程序內共用的計時區段 (span) 與計數器，可輸出 p50 / p95 摘要與 JSON"""
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+MAX_SAMPLES = 1000       # 每個區段保留最近的樣本數
+LOG_FILE = os.environ.get("PERF_LOG")   # 設定後每個區段結束時追加一行 JSON (結構化紀錄)
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=MAX_SAMPLES))
+_totals = defaultdict(int)
+_counters = defaultdict(int)
+_started = time.time()
+
+
+def _log(record):
+    if not LOG_FILE:
+        return
+    with _lock, open(LOG_FILE, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+@contextlib.contextmanager
+def span(name, **fields):
+    """with span("sheets.get_all_values"): ... 量測區塊耗時 (毫秒)"""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        ms = (time.perf_counter() - t0) * 1000
+        with _lock:
+            _samples[name].append(ms)
+            _totals[name] += 1
+        _log({"ts": time.time(), "span": name, "ms": round(ms, 3), **fields})
+
+
+def record(name, ms):
+    """直接記錄一筆耗時 (無法用 with 包住的區段，例如整次 rerun)"""
+    with _lock:
+        _samples[name].append(ms)
+        _totals[name] += 1
+    _log({"ts": time.time(), "span": name, "ms": round(ms, 3)})
+
+
+def incr(name, n=1):
+    with _lock:
+        _counters[name] += n
+
+
+def _pct(sorted_vals, q):
+    if not sorted_vals:
+        return None
+    i = min(len(sorted_vals) - 1, max(0, round(q * (len(sorted_vals) - 1))))
+    return sorted_vals[i]
+
+
+def summary():
+    """[{span, count, p50_ms, p95_ms, max_ms}, ...]，依 p95 由大到小排序 (以最近 MAX_SAMPLES 筆計算)"""
+    with _lock:
+        items = {k: sorted(v) for k, v in _samples.items()}
+        totals = dict(_totals)
+    rows = [{"span": k, "count": totals[k], "p50_ms": round(_pct(v, 0.5), 2),
+             "p95_ms": round(_pct(v, 0.95), 2), "max_ms": round(v[-1], 2)} for k, v in items.items() if v]
+    return sorted(rows, key=lambda r: r["p95_ms"], reverse=True)
+
+
+def counters():
+    with _lock:
+        return dict(sorted(_counters.items()))
+
+
+def export_json():
+    """目前摘要與計數器的 JSON，可保存下來追蹤效能回歸"""
+    return json.dumps({"exported_at": time.time(), "uptime_s": round(time.time() - _started, 1),
+                       "spans": summary(), "counters": counters()}, ensure_ascii=False, indent=2)
+
+
+def reset():
+    with _lock:
+        _samples.clear()
+        _totals.clear()
+        _counters.clear()
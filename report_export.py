@@ -0,0 +1,42 @@
+"""報表匯出：Excel 使用 openpyxl write-only 串流寫入，另提供 CSV / Parquet 供大量資料下載"""
+import io
+
+from openpyxl import Workbook
+
+EXPORT_FORMATS = {
+    "Excel (.xlsx)": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV (.csv)": ("csv", "text/csv"),
+    "Parquet (.parquet)": ("parquet", "application/octet-stream"),
+}
+
+
+def to_xlsx_bytes(df, sheet_name="客服報表"):
+    # write-only 模式逐列寫出，不在記憶體中保留整份 cell 物件
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.append([str(c) for c in df.columns])
+    for row in df.itertuples(index=False, name=None):
+        ws.append(list(row))
+    buf = io.BytesIO()
+    wb.save(buf)
+    return buf.getvalue()
+
+
+def to_csv_bytes(df):
+    # utf-8-sig 讓 Excel 直接開啟中文不亂碼
+    return df.to_csv(index=False).encode("utf-8-sig")
+
+
+def to_parquet_bytes(df):
+    buf = io.BytesIO()
+    df.to_parquet(buf, index=False)
+    return buf.getvalue()
+
+
+def export_bytes(df, fmt):
+    ext = EXPORT_FORMATS[fmt][0]
+    if ext == "xlsx":
+        return to_xlsx_bytes(df)
+    if ext == "csv":
+        return to_csv_bytes(df)
+    return to_parquet_bytes(df)
@@ -0,0 +1,158 @@
+"""案件全文檢索：以字元 bigram 建立倒排索引，隨 CaseStore 新增 / 修補列增量更新"""
+import re
+import threading
+from collections import defaultdict
+
+import perf
+
+# 欄位前綴 (英文 / 中文皆可) -> 欄位索引
+FIELDS = {
+    "date": 0, "日期": 0,
+    "station": 1, "場站": 1,
+    "name": 2, "姓名": 2,
+    "phone": 3, "電話": 3,
+    "plate": 4, "車號": 4,
+    "cat": 5, "類別": 5,
+    "desc": 6, "描述": 6,
+    "staff": 7, "填單人": 7,
+}
+PHONE_COL, PLATE_COL = 3, 4
+
+
+def _grams(text):
+    return set(map(str.__add__, text, text[1:]))
+
+
+def _digits(s):
+    return re.sub(r"\D", "", s)
+
+
+class SearchIndex:
+    """CaseStore 的觀察者 (reset / extend / patch)。
+
+    每列保存正規化後的小寫文字 (車號另存去除 "-" 的版本、電話另存純數字)，
+    查詢時先取所有 bigram 倒排列表的交集，再以子字串比對確認，結果與線性掃描一致。
+    支援 station: / plate: / staff: 等欄位前綴 (以同一份倒排列表篩選，再比對該欄位)，
+    多個詞以空白分隔 (AND)。索引在第一次查詢時才建立，之後隨新增 / 修補增量更新。
+    """
+
+    def __init__(self, normalize_plate=None):
+        self._normalize_plate = normalize_plate or (lambda s: s)
+        self._lock = threading.RLock()
+        self._rows = []
+        self._built = False
+        self._clear()
+
+    def _clear(self):
+        self._all = defaultdict(set)
+        self._texts = {}   # 列號 -> (全欄位文字, {欄位: 文字})
+
+    def _build(self):
+        self._clear()
+        with perf.span("search.build"):
+            for i, r in enumerate(self._rows[1:], start=2):
+                self._add(i, r)
+        self._rows = []
+        self._built = True
+
+    def _row_texts(self, row):
+        fields = {}
+        for col, cell in enumerate(row):
+            t = str(cell).lower()
+            if col == PLATE_COL and t:
+                p = self._normalize_plate(str(cell)).lower()
+                t = f"{t}\x1f{p}\x1f{p.replace('-', '')}"
+            elif col == PHONE_COL and _digits(t):
+                t = f"{t}\x1f{_digits(t)}"
+            fields[col] = t
+        return "\x1f".join(fields.values()), fields
+
+    def _add(self, idx, row):
+        if not any(str(c).strip() for c in row):
+            return
+        text, fields = self._row_texts(row)
+        self._texts[idx] = (text, fields)
+        postings = self._all
+        for g in _grams(text):
+            postings[g].add(idx)
+
+    def _remove(self, idx):
+        entry = self._texts.pop(idx, None)
+        if entry is None:
+            return
+        for g in _grams(entry[0]):
+            self._all[g].discard(idx)
+
+    # --- CaseStore 觀察者介面 (列號 = sheet 列號，第 1 列為標題) ---
+    def reset(self, rows):
+        with self._lock:
+            self._clear()
+            self._rows = list(rows)
+            self._built = False
+
+    def extend(self, start, rows):
+        with self._lock:
+            if not self._built:
+                self._rows.extend(rows)
+                return
+            for i, r in enumerate(rows, start=start):
+                if i > 1:
+                    self._add(i, r)
+
+    def patch(self, idx, old, new):
+        with self._lock:
+            if not self._built:
+                if idx <= len(self._rows):
+                    self._rows[idx - 1] = new
+                return
+            self._remove(idx)
+            if idx > 1:
+                self._add(idx, new)
+
+    # --- 查詢 ---
+    def _parse(self, query):
+        terms = []
+        for tok in query.lower().split():
+            field, sep, value = tok.partition(":")
+            if sep and field in FIELDS and value:
+                col = FIELDS[field]
+                if col == PLATE_COL:
+                    value = self._normalize_plate(value.upper()).lower().replace("-", "")
+                elif col == PHONE_COL and _digits(value):
+                    value = _digits(value)
+                terms.append((col, value))
+            else:
+                terms.append((None, tok))
+        return terms
+
+    def _candidates(self, value):
+        if len(value) < 2:
+            return None  # 單一字元無 bigram，交由逐列比對
+        lists = [self._all.get(g) for g in _grams(value)]
+        if not all(lists):
+            return set()
+        lists.sort(key=len)
+        return set.intersection(*lists)
+
+    def search(self, query):
+        """回傳符合的 sheet 列號 (遞增排序)"""
+        terms = self._parse(query)
+        if not terms:
+            return []
+        with self._lock, perf.span("search.query"):
+            if not self._built:
+                self._build()
+            cand = None
+            for col, value in terms:
+                c = self._candidates(value)
+                if c is not None:
+                    cand = c if cand is None else cand & c
+                if cand is not None and not cand:
+                    return []
+            pool = cand if cand is not None else self._texts.keys()
+            hits = []
+            for idx in pool:
+                text, fields = self._texts[idx]
+                if all(value in (text if col is None else fields.get(col, "")) for col, value in terms):
+                    hits.append(idx)
+        return sorted(hits)
@@ -0,0 +1,83 @@
+"""全程序共用的 gspread 連線池：只授權一次、重用 HTTP 連線、快取 spreadsheet / worksheet 物件"""
+import threading
+import gspread
+
+import perf
+
+SCOPE = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+
+
+class SheetsPool:
+    """包裝單一 gspread Client。
+
+    - gspread.authorize 只執行一次；底層 AuthorizedSession 會在 token 過期時自動刷新並重用連線
+    - client.open() / sheet1 / worksheet() 的結果依名稱快取，之後不再多打 API
+    - 所有 Sheets API 請求都會計數：total 為全程序累計，rerun_calls() 為目前執行緒
+      (Streamlit 每個 session 的腳本執行緒) 自 begin_rerun() 以來的次數
+    """
+
+    def __init__(self, creds=None, client=None):
+        # client 可直接傳入已建立的 Client (例如基準測試用的假 Client)
+        self.client = client if client is not None else gspread.authorize(creds)
+        self._lock = threading.Lock()
+        self._count_lock = threading.Lock()   # 獨立的鎖：spreadsheet() 持有 _lock 時也會發出請求
+        self._spreadsheets = {}
+        self._worksheets = {}
+        self._local = threading.local()
+        self.total = {"read": 0, "write": 0}
+        self._wrap_requests()
+
+    def _wrap_requests(self):
+        # gspread 6 將請求集中在 client.http_client.request，gspread 5 則是 client.request
+        http = getattr(self.client, "http_client", self.client)
+        orig = http.request
+
+        def counted(method, *args, **kwargs):
+            kind = "read" if str(method).lower() == "get" else "write"
+            with self._count_lock:   # 腳本、變更來源、寫入佇列等多個執行緒同時計數
+                self.total[kind] += 1
+            calls = self._calls()
+            calls[kind] += 1
+            perf.incr(f"sheets.{kind}")
+            with perf.span(f"sheets.{kind}"):
+                return orig(method, *args, **kwargs)
+
+        http.request = counted
+
+    def _calls(self):
+        if not hasattr(self._local, "calls"):
+            self._local.calls = {"read": 0, "write": 0}
+        return self._local.calls
+
+    def begin_rerun(self):
+        self._local.calls = {"read": 0, "write": 0}
+
+    def rerun_calls(self):
+        return dict(self._calls())
+
+    def spreadsheet(self, title):
+        with self._lock:
+            if title not in self._spreadsheets:
+                self._spreadsheets[title] = self.client.open(title)
+            return self._spreadsheets[title]
+
+    def worksheet(self, title, name=None, create=None):
+        """取得 worksheet (name 為 None 時為 sheet1)；找不到且有 create 時以 create(spreadsheet) 建立"""
+        key = (title, name)
+        with self._lock:
+            ws = self._worksheets.get(key)
+        if ws is not None:
+            return ws
+        sh = self.spreadsheet(title)
+        if name is None:
+            ws = sh.sheet1
+        else:
+            try:
+                ws = sh.worksheet(name)
+            except gspread.WorksheetNotFound:
+                if create is None:
+                    raise
+                ws = create(sh)
+        with self._lock:
+            self._worksheets[key] = ws
+        return ws
@@ -0,0 +1,21 @@
+"""場站設定：供網頁端與車位紀錄程式共用"""
+
+# --- [新功能] 特定場站後台網址字典 ---
+STATION_BACKENDS = {
+    "文湖場": "https://114.35.111.230/systemSetting/deviceManagement/deviceList",
+    "龍江場": "https://114.34.172.191/systemSetting/deviceManagement/deviceList",
+    "和平東路場": "https://114.32.2.144/systemSetting/deviceManagement/device",
+    "木柵路三段77巷場": "https://111.70.11.228/systemSetting/deviceManagement/device",
+    "大龍場": "https://218.161.19.23/systemSetting/deviceManagement/device",
+    "興岩社福大樓": "https://114.34.59.201/systemSetting/deviceManagement/device",
+    "木柵社宅": "https://220.135.37.120/systemSetting/deviceManagement/device",
+    "西園國宅": "https://1.34.190.66/systemSetting/deviceManagement/device",
+    "士林場": "https://114.32.150.245/systemSetting/deviceManagement/deviceList",
+    "大龍峒社宅": "https://211.21.156.151/systemSetting/deviceManagement/device",
+    "環山": "https://111.70.4.51/systemSetting/deviceManagement/deviceList",
+    "舊宗社宅": "https://220.135.96.128/systemSetting/deviceManagement/device",
+    "景平": "https://114.34.235.247/systemSetting/deviceManagement/device",
+    "青潭國小": "https://111.70.23.175/systemSetting/deviceManagement/deviceList",
+    "水源市場": "https://220.132.13.220/systemSetting/deviceManagement/deviceList",
+    "紅毛城": "https://118.163.137.193/systemSetting/deviceManagement/device"
+}
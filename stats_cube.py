@@ -0,0 +1,139 @@
+"""每日統計立方體 (日期 × 場站 × 類別 件數)：隨 CaseStore 新增 / 修補列增量維護"""
+import bisect
+import datetime
+import threading
+from collections import Counter
+
+import pandas as pd
+
+DATE_COL, STATION_COL, CATEGORY_COL = 0, 1, 5
+
+
+def parse_day(s):
+    """案件時間字串 -> 日期；常見的 ISO 格式走快速路徑，其餘交給 pandas"""
+    s = str(s).strip()
+    if not s:
+        return None
+    try:
+        return datetime.date.fromisoformat(s[:10])
+    except ValueError:
+        pass
+    try:
+        ts = pd.to_datetime(s)
+    except (ValueError, TypeError, OverflowError):
+        return None
+    return None if pd.isna(ts) else ts.date()
+
+
+class StatsCube:
+    """CaseStore 的觀察者 (reset / extend / patch)。
+
+    以 {日期: Counter((場站, 類別) -> 件數)} 保存，任何日期區間的查詢成本只與天數有關，
+    與總案件數無關。
+    """
+
+    def __init__(self, exclude=("其他",)):
+        self._exclude = set(exclude)
+        self._lock = threading.RLock()
+        self._days = {}
+        self._sorted_days = []
+
+    def _key(self, row):
+        if len(row) <= CATEGORY_COL or row[CATEGORY_COL] in self._exclude:
+            return None, None
+        day = parse_day(row[DATE_COL])
+        return (day, (row[STATION_COL], row[CATEGORY_COL])) if day else (None, None)
+
+    def _add(self, row, n=1):
+        day, key = self._key(row)
+        if day is None:
+            return
+        cell = self._days.get(day)
+        if cell is None:
+            cell = self._days[day] = Counter()
+            bisect.insort(self._sorted_days, day)
+        cell[key] += n
+        if cell[key] <= 0:
+            del cell[key]
+
+    # --- CaseStore 觀察者介面 ---
+    def reset(self, rows):
+        with self._lock:
+            days = {}
+            for r in rows[1:]:
+                day, key = self._key(r)
+                if day is not None:
+                    days.setdefault(day, Counter())[key] += 1
+            self._days, self._sorted_days = days, sorted(days)
+
+    def extend(self, start, rows):
+        with self._lock:
+            for i, r in enumerate(rows, start=start):
+                if i > 1:
+                    self._add(r)
+
+    def patch(self, idx, old, new):
+        if idx <= 1:
+            return
+        with self._lock:
+            self._add(old, -1)
+            self._add(new)
+
+    # --- 查詢 ---
+    def _range(self, first, last):
+        lo = bisect.bisect_left(self._sorted_days, first) if first else 0
+        hi = bisect.bisect_right(self._sorted_days, last) if last else len(self._sorted_days)
+        return self._sorted_days[lo:hi]
+
+    def frame(self, first=None, last=None):
+        """回傳區間內 (日期, 場站, 類別, 件數) 的 DataFrame"""
+        with self._lock:
+            recs = [(d, s, c, n) for d in self._range(first, last) for (s, c), n in self._days[d].items()]
+        return pd.DataFrame(recs, columns=["日期", "場站", "類別", "件數"])
+
+    def day_totals(self):
+        """{日期: 當日件數}"""
+        with self._lock:
+            return {d: sum(c.values()) for d, c in self._days.items()}
+
+    def start_for_last(self, n):
+        """往回累計到至少 n 件的起始日期 (取代原本的 tail(n) 預設區間)"""
+        return _start_for_last(self.day_totals(), n)
+
+    def last_day(self):
+        with self._lock:
+            return self._sorted_days[-1] if self._sorted_days else None
+
+
+def _start_for_last(totals, n):
+    days = sorted(totals)
+    total = 0
+    for d in reversed(days):
+        total += totals[d]
+        if total >= n:
+            return d
+    return days[0] if days else None
+
+
+class CombinedCube:
+    """熱資料 (sheet1) 與封存資料兩個 StatsCube 的聯合查詢，介面與 StatsCube 相同。
+
+    frame() 直接串接各立方體的結果，同一 (日期, 場站, 類別) 可能出現兩列，使用端一律以 groupby 加總。
+    """
+
+    def __init__(self, *cubes):
+        self._cubes = [c for c in cubes if c is not None]
+
+    def frame(self, first=None, last=None):
+        frames = [c.frame(first, last) for c in self._cubes]
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def start_for_last(self, n):
+        totals = Counter()
+        for c in self._cubes:
+            totals.update(c.day_totals())
+        return _start_for_last(totals, n)
+
+    def last_day(self):
+        days = [d for d in (c.last_day() for c in self._cubes) if d is not None]
+        return max(days) if days else None
@@ -1,17 +1,34 @@
 import streamlit as st
 from oauth2client.service_account import ServiceAccountCredentials
-import gspread
 import datetime
 import pandas as pd
 import pytz
 import plotly.express as px
 import plotly.graph_objects as go
 import re
-import io
 import requests
+import time
+import threading
+import perf
+from case_store import CaseStore
+from change_feed import FEED_INTERVAL, ChangeFeed
+from write_queue import WriteQueue
+from search_index import SearchIndex
+from stats_cube import CombinedCube, StatsCube
+from case_archive import ArchiveChanged, CaseArchive, archive_closed_months
+from report_export import EXPORT_FORMATS, export_bytes
+from swr_cache import SWRValue
+from stations import STATION_BACKENDS
+from backend_health import BackendHealth
+from occupancy_store import DB_FILE as OCCUPANCY_DB, OccupancyStore
+from auto_record import RECORD_INTERVAL, record_forever
+import os
+from case_table import ROW_COL, build_case_table, date_slice, memory_footprint, time_slice
+from sheets_client import SCOPE, SheetsPool
 
 # --- 1. 頁面基本設定與專業樣式 ---
 st.set_page_config(page_title="應安客服雲端登記系統", page_icon="📝", layout="wide")
+rerun_t0 = time.perf_counter()
 
 st.markdown("""
     <style>
@@ -60,85 +77,153 @@ st.markdown("""
 
 tw_timezone = pytz.timezone('Asia/Taipei')
 
-# --- [新功能] 特定場站後台網址字典 ---
-STATION_BACKENDS = {
-    "文湖場": "https://114.35.111.230/systemSetting/deviceManagement/deviceList",
-    "龍江場": "https://114.34.172.191/systemSetting/deviceManagement/deviceList",
-    "和平東路場": "https://114.32.2.144/systemSetting/deviceManagement/device",
-    "木柵路三段77巷場": "https://111.70.11.228/systemSetting/deviceManagement/device",
-    "大龍場": "https://218.161.19.23/systemSetting/deviceManagement/device",
-    "興岩社福大樓": "https://114.34.59.201/systemSetting/deviceManagement/device",
-    "木柵社宅": "https://220.135.37.120/systemSetting/deviceManagement/device",
-    "西園國宅": "https://1.34.190.66/systemSetting/deviceManagement/device",
-    "士林場": "https://114.32.150.245/systemSetting/deviceManagement/deviceList",
-    "大龍峒社宅": "https://211.21.156.151/systemSetting/deviceManagement/device",
-    "環山": "https://111.70.4.51/systemSetting/deviceManagement/deviceList",
-    "舊宗社宅": "https://220.135.96.128/systemSetting/deviceManagement/device",
-    "景平": "https://114.34.235.247/systemSetting/deviceManagement/device",
-    "青潭國小": "https://111.70.23.175/systemSetting/deviceManagement/deviceList",
-    "水源市場": "https://220.132.13.220/systemSetting/deviceManagement/deviceList",
-    "紅毛城": "https://118.163.137.193/systemSetting/deviceManagement/device"
-}
+# --- [優化] 快取資料讀取函式 (增量同步) ---
+@st.cache_resource
+def get_case_store():
+    """全程序共用的案件列存放區，只抓新增列，不再每次整張重載"""
+    return CaseStore()
+
+@st.cache_resource
+def get_change_feed(_pool):
+    """全程序共用的變更來源：單一背景執行緒每幾秒同步一次，所有 session 共用同一份資料"""
+    return ChangeFeed(get_case_store(), lambda: _pool.worksheet("客服作業表"))
+
+# --- [優化] 型別化資料表：每個資料版本只解析一次日期，兩個分頁共用 ---
+@st.cache_resource(max_entries=2)
+def build_case_table_cached(version, _rows):
+    perf.incr("cache.case_table.miss")
+    with perf.span("app.case_table.build"):
+        return build_case_table(_rows)
+
+@st.cache_resource(max_entries=2)
+def case_table_memory(version, _table):
+    return memory_footprint(_table)
+
+@st.cache_resource
+def get_stats_cube():
+    """每日 (日期 × 場站 × 類別) 統計立方體，隨案件列存放區增量維護"""
+    cube = StatsCube(exclude=("其他",))
+    get_case_store().add_observer(cube)
+    return cube
+
+@st.cache_resource
+def get_backend_health():
+    """場站後台健康檢查 (背景每分鐘並行探測一次)"""
+    return BackendHealth(STATION_BACKENDS)
+
+@st.cache_resource
+def get_occupancy_store():
+    """停車場車位時間序列 (由 start_occupancy_recorder 在本機寫入的 SQLite)"""
+    return OccupancyStore(OCCUPANCY_DB)
+
+@st.cache_resource
+def start_occupancy_recorder(_pool):
+    """在網頁程序內常駐車位紀錄 (每 RECORD_INTERVAL 秒一輪)，寫入圖表讀取的同一個 occupancy.db 並鏡像到 Sheets"""
+    if RECORD_INTERVAL > 0:
+        threading.Thread(target=record_forever, args=(RECORD_INTERVAL, get_occupancy_store()),
+                         kwargs={"pool": _pool}, name="occupancy-recorder", daemon=True).start()
+
+@st.cache_data(max_entries=4, show_spinner="產生報表中...")
+def build_export(first, last, version, archive_version, fmt, _table, _archive):
+    """依 (日期區間, 資料版本, 封存版本, 格式) 快取的匯出檔，只在使用者要求時產生；區間涵蓋封存月份時一併匯出"""
+    perf.incr("cache.export.miss")
+    with perf.span("app.export.build", fmt=fmt):
+        wk = pd.concat([t for t in (_archive.date_slice(first, last), date_slice(_table, first, last)) if t is not None])
+        wk = wk[wk[wk.columns[5]] != "其他"].drop(columns=[ROW_COL])
+        return export_bytes(wk, fmt)
+
+def get_case_table(_feed):
+    """回傳 (資料版本, 原始資料列, 型別化資料表)；只讀取記憶體，不在 rerun 中呼叫 Sheets API"""
+    perf.incr("cache.case_table.call")
+    with perf.span("app.get_case_data"):
+        version, rows = _feed.snapshot()
+        return version, rows, build_case_table_cached(version, rows)
+
+# --- [優化] 獲取台北即時天氣邏輯 (背景更新，頁面不等待網路) ---
+def fetch_taipei_weather():
+    url = "https://api.open-meteo.com/v1/forecast?latitude=25.03&longitude=121.56&current_weather=true"
+    response = requests.get(url, timeout=5)
+    data = response.json()
+    temp = round(data['current_weather']['temperature'])
+    code = data['current_weather']['weathercode']
+    weather_map = {
+        0: "晴朗", 1: "晴間多雲", 2: "多雲", 3: "陰天",
+        45: "霧", 48: "霧", 51: "毛毛細雨", 53: "毛毛細雨", 55: "毛毛細雨",
+        61: "小雨", 63: "中雨", 65: "大雨", 71: "小雪", 73: "中雪", 75: "大雪",
+        77: "雪花", 80: "陣雨", 81: "強陣雨", 82: "極端陣雨",
+        95: "雷陣雨", 96: "雷雨伴隨冰雹", 99: "雷雨伴隨重度冰雹"
+    }
+    desc = weather_map.get(code, f"代碼:{code}") 
+    return f"🌡️ 台北：{temp}°C | {desc}"
 
-# --- [優化] 快取資料讀取函式 ---
-@st.cache_data(ttl=600)  # 快取 10 分鐘，或手動重新整理
-def get_cloud_data(_sheet):
-    """從 Google Sheets 抓取所有原始資料並快取"""
-    return _sheet.get_all_values()
+@st.cache_resource
+def get_weather_cache():
+    """全程序共用：10 分鐘過期後由背景執行緒更新，期間持續顯示舊值"""
+    return SWRValue(fetch_taipei_weather, ttl=600, fallback="🌡️ 台北：連線中...", name="weather")
 
-# --- [優化] 獲取台北即時天氣邏輯 ---
 def get_taipei_weather():
-    try:
-        url = "https://api.open-meteo.com/v1/forecast?latitude=25.03&longitude=121.56&current_weather=true"
-        response = requests.get(url, timeout=5)
-        data = response.json()
-        temp = round(data['current_weather']['temperature'])
-        code = data['current_weather']['weathercode']
-        weather_map = {
-            0: "晴朗", 1: "晴間多雲", 2: "多雲", 3: "陰天",
-            45: "霧", 48: "霧", 51: "毛毛細雨", 53: "毛毛細雨", 55: "毛毛細雨",
-            61: "小雨", 63: "中雨", 65: "大雨", 71: "小雪", 73: "中雪", 75: "大雪",
-            77: "雪花", 80: "陣雨", 81: "強陣雨", 82: "極端陣雨",
-            95: "雷陣雨", 96: "雷雨伴隨冰雹", 99: "雷雨伴隨重度冰雹"
-        }
-        desc = weather_map.get(code, f"代碼:{code}") 
-        return f"🌡️ 台北：{temp}°C | {desc}"
-    except Exception as e:
-        return "🌡️ 台北：連線中..."
-
-# --- 2. 初始資料與連線 ---
+    return get_weather_cache().get()
+
+# 場站清單快取 (1 小時)
+@st.cache_data(ttl=3600)
+def get_stations(_ws):
+    perf.incr("cache.stations.miss")
+    return _ws.col_values(1)[1:]
+
+# --- [優化] 分資料集的快取失效：只清除受影響的資料集，不再 st.cache_data.clear() 全清 ---
+CACHE_DATASETS = {
+    "stations": lambda: get_stations.clear(),
+    "cases": lambda: pool and get_change_feed(pool).poll_now(),
+    "weather": lambda: get_weather_cache().invalidate(),
+    "archive": lambda: pool and (get_case_archive(pool).refresh(), get_change_feed(pool).poll_now()),
+}
+
+def invalidate_cache(*names):
+    for name in names: CACHE_DATASETS[name]()
+
+# --- 2. 初始資料與連線 (全程序共用連線池) ---
+@st.cache_resource
+def get_sheets_pool():
+    creds_dict = st.secrets["google_sheets"]
+    creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, SCOPE)
+    return SheetsPool(creds)
+
 def init_connection():
-    scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-    try:
-        creds_dict = st.secrets["google_sheets"]
-        creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-        return gspread.authorize(creds)
+    try: return get_sheets_pool()
     except: return None
 
-client = init_connection()
+def create_station_ws(sh):
+    ws = sh.add_worksheet(title="Station_Settings", rows="100", cols="5")
+    ws.append_row(["場站名稱"])
+    return ws
+
+@st.cache_resource
+def get_write_queue(_pool):
+    """全程序共用的案件寫入佇列 (背景批次寫入 + 本地日誌)"""
+    return WriteQueue(lambda: _pool.worksheet("客服作業表"), get_case_store())
+
+with perf.span("app.init_connection"):
+    pool = init_connection()
 
 # --- 3. 核心邏輯：場站清單與快取管理 ---
-if client:
-    main_spreadsheet = client.open("客服作業表")
-    sheet = main_spreadsheet.sheet1
-    try:
-        station_ws = main_spreadsheet.worksheet("Station_Settings")
-    except:
-        station_ws = main_spreadsheet.add_worksheet(title="Station_Settings", rows="100", cols="5")
-        station_ws.append_row(["場站名稱"])
-
-    # 這裡也對場站清單做簡單快取
-    @st.cache_data(ttl=3600)
-    def get_stations(_ws):
-        return _ws.col_values(1)[1:]
-
-    cloud_stations = get_stations(station_ws)
+if pool:
+    pool.begin_rerun() # 每次 rerun 重新計算 Sheets API 次數
+    with perf.span("app.open_worksheets"):
+        sheet = pool.worksheet("客服作業表")
+        station_ws = pool.worksheet("客服作業表", "Station_Settings", create=create_station_ws)
+    write_q = get_write_queue(pool)
+    feed = get_change_feed(pool)
+    start_occupancy_recorder(pool)
+
+    perf.incr("cache.stations.call")
+    with perf.span("app.get_stations"):
+        cloud_stations = get_stations(station_ws)
     if not cloud_stations:
         STATION_LIST = ["請選擇或輸入關鍵字搜尋", "華視光復", "其他(未登入場站)"]
     else:
         STATION_LIST = ["請選擇或輸入關鍵字搜尋"] + sorted(list(set(cloud_stations))) + ["其他(未登入場站)"]
 else:
-    sheet = None
+    sheet = write_q = feed = None
     STATION_LIST = ["連線失敗"]
 
 STAFF_LIST = ["請選擇填單人", "宗哲", "美妞", "政宏", "文輝", "恩佳", "新人","志榮", "阿錨", "子毅", "浚"]
@@ -164,10 +249,30 @@ def format_car_number(car_str):
     if match_reverse: return f"{match_reverse.group(1)}-{match_reverse.group(2)}"
     return clean_s
 
+@st.cache_resource
+def get_search_index():
+    """全欄位搜尋的倒排索引，隨案件列存放區增量更新"""
+    index = SearchIndex(normalize_plate=format_car_number)
+    get_case_store().add_observer(index)
+    return index
+
+@st.cache_resource
+def get_case_archive(_pool):
+    """已封存月份的唯讀查詢 (搜尋 / 統計 / 匯出)，各月份只下載一次並快取成本地 Parquet；
+    月份清單由變更來源的背景執行緒定期檢查"""
+    archive = CaseArchive(_pool, normalize_plate=format_car_number)
+    get_change_feed(_pool).add_task(archive.check)
+    return archive
+
 if "edit_mode" not in st.session_state: st.session_state.edit_mode = False
 if "edit_row_idx" not in st.session_state: st.session_state.edit_row_idx = None
 if "edit_data" not in st.session_state: st.session_state.edit_data = [""] * 8
 if "form_id" not in st.session_state: st.session_state.form_id = 0
+if "marked_rows" not in st.session_state: st.session_state.marked_rows = set()
+
+def toggle_mark(r_idx):
+    # 標記狀態存在 session_state，換頁後 checkbox 不在畫面上也不會遺失
+    st.session_state.marked_rows ^= {r_idx}
 
 tab1, tab2 = st.tabs(["📝 案件登記", "📊 數據統計分析"])
 
@@ -194,14 +299,14 @@ with tab1:
         if c_new2.button("➕ 確認新增", use_container_width=True):
             if new_st_name.strip():
                 station_ws.append_row([new_st_name.strip()])
-                st.cache_data.clear() # 清除快取以顯示新場站
+                invalidate_cache("stations") # 只清除場站清單快取
                 st.success(f"已成功新增場站：{new_st_name}")
                 st.rerun()
         
         # 新增手動刷新按鈕
         if c_refresh.button("🔄 刷新雲端資料", use_container_width=True):
-            st.cache_data.clear()
-            st.toast("已同步最新雲端資料！")
+            invalidate_cache("stations", "cases", "archive")
+            st.toast("已要求立即比對雲端資料，有變動會在數秒內更新")
             st.rerun()
     
     st.divider()
@@ -216,6 +321,14 @@ with tab1:
     with col_st_1:
         station_name = st.selectbox("🏢 選擇場站名稱", options=STATION_LIST, 
                                      index=STATION_LIST.index(d[1]) if d[1] in STATION_LIST else 0)
+    with col_st_2:
+        # 後台狀態只讀取背景探測的快取結果，不增加 rerun 延遲
+        if station_name in STATION_BACKENDS:
+            h = get_backend_health().status(station_name)
+            if h is None: badge = "⚪ 後台狀態檢查中..."
+            elif h.up: badge = f"🟢 後台正常（{h.latency_ms:.0f} ms）"
+            else: badge = f"🔴 後台無法連線（{h.error}）"
+            st.markdown(f"<div style='margin-top: 2.2rem;'>{badge}</div>", unsafe_allow_html=True)
 
     with st.form(key=f"my_form_{st.session_state.form_id}", clear_on_submit=False):
         f_dt = d[0] if st.session_state.edit_mode else now_ts.strftime("%Y-%m-%d %H:%M")
@@ -261,13 +374,15 @@ with tab1:
             if user_name != "請選擇填單人" and station_name != "請選擇或輸入關鍵字搜尋":
                 final_car_num = format_car_number(car_num)
                 row = [f_dt, station_name, caller_name, caller_phone, final_car_num, category, description, user_name]
+                # 排入寫入佇列後立即返回，由背景批次寫入雲端
                 if st.session_state.edit_mode:
-                    sheet.update(f"A{st.session_state.edit_row_idx}:H{st.session_state.edit_row_idx}", [row])
+                    # 附上編輯前的內容：若期間封存使列號位移，寫入佇列會依內容找回正確的列
+                    write_q.enqueue_update(st.session_state.edit_row_idx, row, old=st.session_state.edit_data)
                     st.session_state.edit_mode, st.session_state.edit_row_idx, st.session_state.edit_data = False, None, [""] * 8
                 else: 
-                    sheet.append_row(row)
+                    write_q.enqueue_append(row)
                 
-                st.cache_data.clear() # 提交後清除快取，確保列表更新
+                st.toast("📤 已排入送出佇列，背景寫入雲端中")
                 st.session_state.form_id += 1 
                 st.rerun()
             else: st.error("請正確選擇填單人與場站")
@@ -275,32 +390,66 @@ with tab1:
     # --- 最近紀錄 (使用快取優化) ---
     st.markdown("---")
     st.subheader("🔍 最近紀錄 (交班動態)")
-    if sheet:
-        # 改用快取函式讀取資料
-        all_raw = get_cloud_data(sheet)
+    # --- 即時更新：每 FEED_INTERVAL 秒只重跑這一段，從共用變更來源讀取記憶體資料 ---
+    # 其他 session 新增 / 編輯的案件數秒內出現，且不增加 Sheets API 讀取
+    @st.fragment(run_every=FEED_INTERVAL)
+    def recent_cases():
+        now_ts = datetime.datetime.now(tw_timezone)
+        _, all_raw, case_table = get_case_table(feed)
         if len(all_raw) > 1:
-            valid_rows = [(i+2, r) for i, r in enumerate(all_raw[1:]) if any(str(c).strip() for c in r)]
-            search_q = st.text_input("🔍 搜尋歷史紀錄 (全欄位)", placeholder="輸入關鍵字...").strip().lower()
+            search_q = st.text_input("🔍 搜尋歷史紀錄 (全欄位)", placeholder="輸入關鍵字，可用 station: / plate: / staff: 指定欄位...").strip().lower()
             eight_hrs_ago = (now_ts.replace(tzinfo=None)) - datetime.timedelta(hours=8)
             display_list = []
             
             if search_q: 
-                display_list = [(idx, r) for idx, r in valid_rows if any(search_q in str(cell).lower() for cell in r)]
+                with perf.span("app.search"):
+                    display_list = [(idx, all_raw[idx - 1]) for idx in get_search_index().search(search_q) if idx <= len(all_raw)]
+                # 封存月份的案件排在熱資料之前 (時間較早)，只能檢視不能編輯
+                with perf.span("app.search.archive"):
+                    display_list = [("已封存", r) for r in get_case_archive(pool).search(search_q)] + display_list
             else:
-                for idx, r in valid_rows:
-                    try:
-                        dt = pd.to_datetime(r[0]).replace(tzinfo=None)
-                        if dt >= eight_hrs_ago: display_list.append((idx, r))
-                    except: continue
-                if not display_list: display_list = valid_rows[-3:]
+                # 資料表已依時間排序，以二分搜尋直接取出最近 8 小時
+                with perf.span("app.recent_slice"):
+                    display_list = [(int(i), all_raw[i - 1]) for i in time_slice(case_table, eight_hrs_ago)[ROW_COL]]
+                if not display_list: display_list = [(int(i), all_raw[i - 1]) for i in sorted(case_table[ROW_COL].tail(3))]
+                # 尚未寫入雲端的案件以「排隊中」顯示在最上方
+                display_list = display_list + [(None, r) for r in write_q.pending_rows()]
+
+            if write_q.pending_count():
+                st.info(f"⏳ {write_q.pending_count()} 筆案件排隊寫入雲端中")
+            if write_q.last_error:
+                st.warning(f"⚠️ 雲端寫入暫時失敗，稍後自動重試：{write_q.last_error}")
+            if write_q.dead:
+                # 無法重試的寫入 (例如 400) 不再阻擋其他案件，列出來讓客服人員確認
+                st.error(f"❌ {len(write_q.dead)} 筆案件無法寫入雲端，請確認內容後重送")
+                with st.expander("查看寫入失敗的案件"):
+                    for op in write_q.dead:
+                        kind = "新增" if op["op"] == "append" else f"編輯第 {op['idx']} 列"
+                        st.text(f"{kind}：{' | '.join(map(str, op['row']))}\n　原因：{op['error']}")
+                    d_c1, d_c2 = st.columns(2)
+                    if d_c1.button("🔁 全部重送", key="dead_retry"):
+                        write_q.retry_dead()
+                        st.rerun()
+                    if d_c2.button("🗑️ 清除", key="dead_clear"):
+                        write_q.clear_dead()
+                        st.rerun()
 
             if display_list:
+                # --- [優化] 分頁顯示：只渲染目前頁面的列，筆數再多 rerun 時間也固定 ---
+                p_c1, p_c2, p_c3 = st.columns([1, 1, 4])
+                page_size = p_c1.selectbox("每頁筆數", [10, 20, 50], index=1)
+                total_pages = max(1, -(-len(display_list) // page_size))
+                page = p_c2.number_input("頁數", min_value=1, max_value=total_pages, value=1, step=1, key=f"page_{search_q}_{page_size}")
+                p_c3.caption(f"共 {len(display_list)} 筆，第 {page} / {total_pages} 頁")
+                page_rows = display_list[::-1][(page - 1) * page_size: page * page_size]
+
                 col_widths = [0.9, 0.6, 0.9, 1.2, 1.0, 1.5, 5.1, 0.8, 0.6, 0.6]
                 cols = st.columns(col_widths)
                 headers = ["日期/時間", "場站", "姓名", "電話", "車號", "類別", "描述摘要", "填單人", "編輯", "標記"]
                 for col, t in zip(cols, headers): col.markdown(f"**{t}**")
                 
-                for r_idx, r_val in reversed(display_list):
+                render_t0 = time.perf_counter()
+                for r_idx, r_val in page_rows:
                     c = st.columns(col_widths)
                     c[0].write(f"**{r_val[0]}**") 
                     c[1].write(r_val[1]); c[2].write(r_val[2]); c[3].write(r_val[3]); c[4].write(r_val[4]); c[5].write(r_val[5])
@@ -308,40 +457,59 @@ with tab1:
                     short_d = f"{clean_d[:35]}..." if len(clean_d) > 35 else clean_d
                     c[6].markdown(f'<div class="hover-text" title="{clean_d}">{short_d}</div>', unsafe_allow_html=True)
                     c[7].write(r_val[7])
-                    if c[8].button("📝", key=f"ed_{r_idx}"):
-                        st.session_state.edit_mode, st.session_state.edit_row_idx, st.session_state.edit_data = True, r_idx, r_val
-                        st.rerun()
-                    c[9].checkbox(" ", key=f"chk_{r_idx}", label_visibility="collapsed")
+                    if r_idx is None:
+                        c[8].write("⏳"); c[9].write("排隊中")
+                    elif isinstance(r_idx, str):
+                        c[8].write("🗄️"); c[9].write(r_idx)
+                    else:
+                        if c[8].button("📝", key=f"ed_{r_idx}"):
+                            st.session_state.edit_mode, st.session_state.edit_row_idx, st.session_state.edit_data = True, r_idx, r_val
+                            st.rerun()
+                        c[9].checkbox(" ", key=f"chk_{r_idx}", value=r_idx in st.session_state.marked_rows,
+                                      on_change=toggle_mark, args=(r_idx,), label_visibility="collapsed")
                     st.markdown("<hr style='margin: 2px 0; border-top: 1px solid #ddd;'>", unsafe_allow_html=True)
+                perf.record("app.render_rows", (time.perf_counter() - render_t0) * 1000)
+
+    if sheet:
+        recent_cases()
 
 # --- Tab 2: 數據統計 ---
 with tab2:
     st.title("📊 數據統計與分析")
     if st.text_input("管理員密碼", type="password", key="stat_pwd") == "kevin198":
         if sheet:
-            raw_stat = get_cloud_data(sheet)
+            archive = get_case_archive(pool)
+            with perf.span("app.archive.cube"):
+                cube = CombinedCube(get_stats_cube(), archive.cube())
+            data_ver, raw_stat, df_s = get_case_table(feed)
             if len(raw_stat) > 1:
                 hdr = raw_stat[0]
-                df_s = pd.DataFrame(raw_stat[1:], columns=hdr)
-                df_s[hdr[0]] = pd.to_datetime(df_s[hdr[0]], errors='coerce')
-                df_s = df_s.dropna(subset=[hdr[0]])
-                df_filtered = df_s[df_s[hdr[5]] != "其他"]
+                st.caption(f"資料表：{len(df_s)} 筆 / 記憶體 {case_table_memory(data_ver, df_s) / 1024 / 1024:.1f} MB"
+                           f"（另有 {len(archive.periods())} 個月份已封存，統計與搜尋自動納入）")
                 
                 c_range = st.date_input("📅 選擇統計週期", value=[])
-                wk_df = df_filtered.loc[(df_filtered[hdr[0]].dt.date >= c_range[0]) & (df_filtered[hdr[0]].dt.date <= c_range[1])] if len(c_range) == 2 else df_filtered.tail(300)
-
-                if not wk_df.empty:
-                    output = io.BytesIO()
-                    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                        wk_df.to_excel(writer, index=False, sheet_name='客服報表')
-                    excel_data = output.getvalue()
-                    
-                    st.download_button(
-                        label="📥 下載 Excel (.xlsx)",
-                        data=excel_data,
-                        file_name=f"應安報表_{datetime.date.today()}.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
+                # 未選區間時預設為最近約 300 件所涵蓋的日期 (以日為單位)
+                r_first, r_last = (c_range[0], c_range[1]) if len(c_range) == 2 else (cube.start_for_last(300), cube.last_day())
+                # --- [優化] 所有圖表皆由統計立方體查詢，成本與天數相關而非案件數 ---
+                with perf.span("app.stats_cube.query"):
+                    wk_cube = cube.frame(r_first, r_last)
+
+                if not wk_cube.empty:
+                    # --- [優化] 報表只在按下產生時建立，並依 (區間, 資料版本, 格式) 快取 ---
+                    e_c1, e_c2, e_c3 = st.columns([1.2, 1, 2])
+                    exp_fmt = e_c1.selectbox("匯出格式", list(EXPORT_FORMATS), label_visibility="collapsed")
+                    export_key = (r_first, r_last, data_ver, archive.version, exp_fmt)
+                    if e_c2.button("📦 產生報表檔案", use_container_width=True):
+                        st.session_state.export_key = export_key
+                    if st.session_state.get("export_key") == export_key:
+                        ext, mime = EXPORT_FORMATS[exp_fmt]
+                        perf.incr("cache.export.call")
+                        e_c3.download_button(
+                            label=f"📥 下載 {exp_fmt}",
+                            data=build_export(r_first, r_last, data_ver, archive.version, exp_fmt, df_s, archive),
+                            file_name=f"應安報表_{datetime.date.today()}.{ext}",
+                            mime=mime
+                        )
                     
                     st.divider()
                     config_4k = {'toImageButtonOptions': {'format': 'png', 'height': 1080, 'width': 1920, 'scale': 2}}
@@ -361,12 +529,10 @@ with tab2:
                         return fig
 
                     # 1. ⏳ 雙週案件類別對比分析
-                    t_data = df_filtered.copy(); t_data['D'] = t_data[hdr[0]].dt.date
                     td = datetime.date.today()
                     tw_s, lw_s, lw_e = td-datetime.timedelta(days=6), td-datetime.timedelta(days=13), td-datetime.timedelta(days=7)
                     def get_c(s, e, l):
-                        m = (t_data['D'] >= s) & (t_data['D'] <= e)
-                        r = t_data.loc[m][hdr[5]].value_counts().reindex(STAT_CATEGORY_LIST, fill_value=0).reset_index(name='件數')
+                        r = cube.frame(s, e).groupby('類別')['件數'].sum().reindex(STAT_CATEGORY_LIST, fill_value=0).reset_index(name='件數')
                         r.columns = ['類別', '件數']; r['週期'] = l; return r
                     df_c = pd.concat([get_c(lw_s, lw_e, "上週 (前7日)"), get_c(tw_s, td, "本週 (最近7日)")])
                     fig_c = px.bar(df_c, x='類別', y='件數', color='週期', barmode='group', text='件數', color_discrete_map={"本週 (最近7日)": "#1f77b4", "上週 (前7日)": "#ff7f0e"})
@@ -375,18 +541,18 @@ with tab2:
                     st.divider()
                     g1, g2 = st.columns(2)
                     with g1:
-                        cat_c = wk_df[hdr[5]].value_counts().reset_index(); cat_c.columns=['類別','件數']
+                        cat_c = wk_cube.groupby('類別')['件數'].sum().sort_values(ascending=False).reset_index(); cat_c.columns=['類別','件數']
                         fig1 = px.bar(cat_c, x='類別', y='件數', text='件數', color='類別', color_discrete_map=CATEGORY_COLOR_MAP)
                         st.plotly_chart(apply_bold_style(fig1, "📂 當前區間案件分佈"), use_container_width=True, config=config_4k)
                     with g2:
-                        st_counts = wk_df[hdr[1]].value_counts().reset_index()
+                        st_counts = wk_cube.groupby('場站')['件數'].sum().sort_values(ascending=False).reset_index()
                         st_counts.columns = ['場站', '件數']; top10_df = st_counts.head(10)
                         fig2 = px.bar(top10_df, x='場站', y='件數', text='件數', color='場站', color_discrete_sequence=px.colors.qualitative.Pastel)
                         st.plotly_chart(apply_bold_style(fig2, "🏢 場站排名 (Top 10)"), use_container_width=True, config=config_4k)
 
                     st.divider()
                     top10_names = top10_df['場站'].tolist()
-                    cross = wk_df[wk_df[hdr[1]].isin(top10_names)].groupby([hdr[1], hdr[5]]).size().reset_index(name='件數')
+                    cross = wk_cube[wk_cube['場站'].isin(top10_names)].groupby(['場站', '類別'])['件數'].sum().reset_index()
                     cross.columns = ['場站', '異常類別', '件數']
                     fig3 = px.bar(cross, x='場站', y='件數', color='異常類別', text='件數', color_discrete_map=CATEGORY_COLOR_MAP)
                     st.plotly_chart(apply_bold_style(fig3, "🔍 場站 vs. 異常類別分析 (Top 10)", is_stacked=True), use_container_width=True, config=config_4k)
@@ -396,10 +562,69 @@ with tab2:
                     st.plotly_chart(apply_bold_style(fig4, "📈 類別精確統計", is_h=True), use_container_width=True, config=config_4k)
 
                     st.divider()
-                    daily_counts = wk_df.groupby(wk_df[hdr[0]].dt.date).size().reset_index(name='件數')
+                    daily_counts = wk_cube.groupby('日期')['件數'].sum().reset_index()
                     daily_counts.columns = ['日期', '件數']
                     fig5 = px.line(daily_counts, x='日期', y='件數', text='件數', markers=True)
                     fig5.update_traces(textposition="top center", line=dict(width=4), marker=dict(size=12))
                     st.plotly_chart(apply_bold_style(fig5, "📈 每日案件量趨勢圖"), use_container_width=True, config=config_4k)
 
+                    # --- 停車場車位趨勢：直接讀取本地時間序列，不經過 Sheets API ---
+                    if os.path.exists(OCCUPANCY_DB):
+                        st.divider()
+                        occ = get_occupancy_store()
+                        o_c1, o_c2 = st.columns([2, 1])
+                        occ_lot = o_c1.selectbox("🅿️ 停車場", occ.lots())
+                        occ_gran = o_c2.radio("統計粒度", ["每小時", "每日"], horizontal=True)
+                        occ_df = pd.DataFrame(
+                            occ.downsample(r_first, r_last + datetime.timedelta(days=1), "hour" if occ_gran == "每小時" else "day", lot=occ_lot),
+                            columns=['時間', '停車場', '最少', '平均', '最多', '筆數'])
+                        if not occ_df.empty:
+                            fig6 = go.Figure([
+                                go.Scatter(x=occ_df['時間'], y=occ_df['最多'], name='最多', line=dict(width=0), showlegend=False),
+                                go.Scatter(x=occ_df['時間'], y=occ_df['最少'], name='最少', line=dict(width=0), fill='tonexty', fillcolor='rgba(31,119,180,0.2)', showlegend=False),
+                                go.Scatter(x=occ_df['時間'], y=occ_df['平均'].round(1), name='平均', mode='lines+markers', line=dict(width=4, color='#1f77b4')),
+                            ])
+                            st.plotly_chart(apply_bold_style(fig6, f"🅿️ {occ_lot} 剩餘車位趨勢 ({occ_gran})", is_line=True), use_container_width=True, config=config_4k)
+
+        # --- 資料封存 (管理員)：已結束的月份移到封存工作表，作業表只保留最近幾個月 ---
+        if pool:
+            st.divider()
+            with st.expander("🗄️ 資料封存"):
+                st.caption(f"已封存月份：{', '.join(sorted(get_case_archive(pool).periods())) or '無'}")
+                if write_q.pending_count():
+                    st.info("仍有案件排隊寫入雲端，請稍後再封存")
+                elif st.button("🗄️ 封存已結束月份"):
+                    try:
+                        with st.spinner("封存中..."):
+                            archived = archive_closed_months(pool)
+                    except ArchiveChanged as e:
+                        invalidate_cache("cases", "archive")
+                        st.warning(f"⚠️ {e}")
+                    else:
+                        invalidate_cache("cases", "archive")
+                        st.session_state.marked_rows = set() # 列號已位移，清除標記
+                        st.success("、".join(f"{p_name} {n} 筆" for p_name, n in archived.items()) or "沒有需要封存的月份")
+
+        # --- 效能監控 (管理員)：各區段 p50 / p95 與快取 / API 計數 ---
+        st.divider()
+        with st.expander("⏱️ 效能監控"):
+            perf_rows = perf.summary()
+            if perf_rows: st.dataframe(pd.DataFrame(perf_rows), use_container_width=True, hide_index=True)
+            perf_counts = perf.counters()
+            cache_names = sorted({k.split(".")[1] for k in perf_counts if k.startswith("cache.")})
+            cache_rows = [{"快取": n, "呼叫": perf_counts.get(f"cache.{n}.call", 0), "未命中": perf_counts.get(f"cache.{n}.miss", 0)} for n in cache_names]
+            if cache_rows: st.dataframe(pd.DataFrame(cache_rows), use_container_width=True, hide_index=True)
+            st.json({k: v for k, v in perf_counts.items() if not k.startswith("cache.")}, expanded=False)
+            st.download_button("📥 下載效能紀錄 (JSON)", perf.export_json(), file_name=f"perf_{datetime.date.today()}.json", mime="application/json")
+
+if pool:
+    api_calls = pool.rerun_calls()
+    st.caption(f"Sheets API：本次讀取 {api_calls['read']} 次 / 寫入 {api_calls['write']} 次（程序累計 {pool.total['read'] + pool.total['write']} 次）")
+    feed_age = feed.age()
+    st.caption(f"即時同步：每 {FEED_INTERVAL} 秒由背景檢查一次，{'尚未同步' if feed_age is None else f'{feed_age:.0f} 秒前'}"
+               f"{f'（同步暫時失敗，稍後重試：{feed.last_error}）' if feed.last_error else ''}")
+w_stats, w_age = get_weather_cache().stats, get_weather_cache().age()
+if w_stats["last_duration"] is not None:
+    st.caption(f"天氣更新：耗時 {w_stats['last_duration']:.2f} 秒 / 資料 {'尚未取得' if w_age is None else f'{w_age / 60:.0f} 分鐘前'}（成功 {w_stats['refresh']} 次、失敗 {w_stats['error']} 次）")
 st.caption("© 2026 應安客服系統 ")
+perf.record("app.rerun", (time.perf_counter() - rerun_t0) * 1000)
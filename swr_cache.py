@@ -0,0 +1,68 @@
+"""stale-while-revalidate 快取：讀取永遠立即回傳目前的值，過期時由背景執行緒更新"""
+import threading
+import time
+
+import perf
+
+
+class SWRValue:
+    """包裝一個可能很慢的 fetch()。
+
+    - get() 不等待網路：回傳最近一次成功的結果 (尚無結果時回傳 fallback)
+    - 超過 ttl 秒或被 invalidate() 後，下一次 get() 會啟動一個背景更新 (同時只會有一個)
+    - 更新失敗保留舊值，retry 秒後再試；stats / age() 提供最近一次更新耗時、失敗次數與資料新舊
+    """
+
+    def __init__(self, fetch, ttl, fallback=None, name="swr", retry=60):
+        self._fetch = fetch
+        self._ttl = ttl
+        self._retry = min(retry, ttl)
+        self._fallback = fallback
+        self._name = name
+        self._lock = threading.Lock()
+        self._value = None
+        self._has_value = False
+        self._fetched_at = None
+        self._next_at = 0.0
+        self._refreshing = False
+        self.stats = {"refresh": 0, "error": 0, "last_duration": None, "last_error": None}
+
+    def get(self):
+        perf.incr(f"cache.{self._name}.call")
+        with self._lock:
+            if time.monotonic() >= self._next_at and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._refresh, name=f"{self._name}-refresh", daemon=True).start()
+            return self._value if self._has_value else self._fallback
+
+    def invalidate(self):
+        with self._lock:
+            self._next_at = 0.0
+
+    def _refresh(self):
+        t0 = time.perf_counter()
+        try:
+            with perf.span(f"{self._name}.refresh"):
+                value = self._fetch()
+        except Exception as e:
+            with self._lock:
+                self.stats["error"] += 1
+                perf.incr(f"{self._name}.error")
+                self.stats["last_error"] = str(e)
+                # 失敗時也延後下次更新，避免每次 rerun 都重新打外部 API
+                self._next_at = time.monotonic() + self._retry
+        else:
+            with self._lock:
+                self._value, self._has_value = value, True
+                self._fetched_at = time.monotonic()
+                self._next_at = self._fetched_at + self._ttl
+                self.stats["refresh"] += 1
+        finally:
+            with self._lock:
+                self.stats["last_duration"] = time.perf_counter() - t0
+                self._refreshing = False
+
+    def age(self):
+        """距離最近一次更新的秒數 (尚未更新過為 None)"""
+        with self._lock:
+            return None if self._fetched_at is None else time.monotonic() - self._fetched_at
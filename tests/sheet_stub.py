@@ -0,0 +1,33 @@
+"""測試用的工作表替身 (gspread 6 的回傳格式)"""
+import re
+
+HEADER = ["時間", "場站", "姓名", "電話", "車號", "類別", "描述", "填單人"]
+
+
+class SheetStub:
+    """只實作 CaseStore 用到的讀取 API；空範圍與 gspread 相同回傳 [[]]"""
+
+    def __init__(self, rows):
+        self.rows = [list(r) for r in rows]
+        self.calls = 0
+
+    def get_all_values(self):
+        self.calls += 1
+        return [list(r) for r in self.rows]
+
+    def _slice(self, rng):
+        start, end = re.match(r"A(\d+):[A-Z]+(\d+)?$", rng).groups()
+        out = [list(r) for r in self.rows[int(start) - 1:int(end) if end else None]]
+        return out or [[]]
+
+    def get(self, rng):
+        self.calls += 1
+        return self._slice(rng)
+
+    def batch_get(self, ranges):
+        self.calls += 1
+        return [self._slice(r) for r in ranges]
+
+
+def case(i):
+    return [f"2026-10-01 10:{i:02d}", "華視光復", f"客戶{i}", "0912345678", "ABC-1234", "無法找零", "描述", "宗哲"]
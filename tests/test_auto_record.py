@@ -0,0 +1,110 @@
+import asyncio
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+pytest.importorskip("oauth2client")
+pytest.importorskip("pytz")
+pytest.importorskip("gspread")
+import auto_record  # noqa: E402
+from occupancy_store import OccupancyStore  # noqa: E402
+from parking_parser import SpotReading  # noqa: E402
+
+LOTS = ["碧華國小", "華視光復", "民生社區", "南港展覽館", "信義廣場", "斷線"]
+DELAY = 0.3              # 秒：stub 每個請求的回應時間 (讓請求彼此重疊)
+
+
+class ParkingApiStub:
+    """本機的停車場 API 替身：記錄每個請求的開始時間與同時進行的請求數；「斷線」直接關閉連線"""
+
+    def __init__(self):
+        self.starts = []
+        self.active = self.max_active = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                lot = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)["parkinglotname"][0]
+                with stub._lock:
+                    stub.starts.append(time.monotonic())
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                try:
+                    time.sleep(DELAY)
+                    if lot == "斷線":
+                        self.close_connection = True
+                        return
+                    body = json.dumps({"Data": [{"AvailableCar": str(LOTS.index(lot) + 10)}]}).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}/RealtimeInfo.ashx"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MirrorSheet:
+    def __init__(self):
+        self.calls = []
+
+    def append_rows(self, rows, **kwargs):
+        self.calls.append(rows)
+
+
+class PoolStub:
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def worksheet(self, title, name=None):
+        return self.sheet
+
+
+@pytest.fixture
+def api(monkeypatch):
+    stub = ParkingApiStub()
+    monkeypatch.setattr(auto_record, "API_URL", stub.url)
+    yield stub
+    stub.close()
+
+
+def test_poll_lots_spacing_concurrency_and_failures(api):
+    results = dict(asyncio.run(auto_record.poll_lots(LOTS, auto_record.make_session())))
+
+    assert [results[lot].spots for lot in LOTS[:-1]] == [10, 11, 12, 13, 14]
+    assert results["斷線"] == SpotReading.failed("連線異常")
+    gaps = [b - a for a, b in zip(api.starts, api.starts[1:])]
+    assert min(gaps) >= auto_record.MIN_INTERVAL * 0.9        # 同一主機的請求間隔
+    assert 1 < api.max_active <= auto_record.MAX_PER_HOST     # 有並行，但不超過上限
+
+
+def test_run_cycle_mirrors_once_per_cycle(api, tmp_path):
+    store = OccupancyStore(str(tmp_path / "occupancy.db"))
+    sheet = MirrorSheet()
+    session = auto_record.make_session()
+
+    auto_record.run_cycle(LOTS, session, store, PoolStub(sheet))
+    assert len(sheet.calls) == 1 and len(sheet.calls[0]) == len(LOTS)
+    assert sorted(row[2] for row in sheet.calls[0]) == sorted(LOTS)
+    assert not store.pending_mirror()
+
+    auto_record.run_cycle(LOTS[:2], session, store, PoolStub(sheet))
+    assert [len(rows) for rows in sheet.calls] == [len(LOTS), 2]
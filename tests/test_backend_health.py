@@ -0,0 +1,108 @@
+import socket
+import threading
+import time
+import warnings
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+from urllib3.exceptions import InsecureRequestWarning  # noqa: E402
+
+from backend_health import BackendHealth  # noqa: E402
+
+
+def stub_server(status=200, delay=0.0, peers=None):
+    """本機的場站後台替身，回傳 (url, 關閉函式)；peers 記錄每個請求的用戶端位址"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"   # keep-alive
+
+        def do_HEAD(self, body=b""):
+            if peers is not None:
+                peers.append(self.client_address)
+            time.sleep(delay)
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body and self.command == "GET":
+                self.wfile.write(body)
+
+        def do_GET(self):
+            self.do_HEAD(b"<html>" + b"x" * 4096 + b"</html>")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def close():
+        server.shutdown()
+        server.server_close()
+    return f"http://127.0.0.1:{server.server_port}/", close
+
+
+def closed_port_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{s.getsockname()[1]}/"
+
+
+@pytest.fixture
+def servers():
+    closers = []
+
+    def make(**kwargs):
+        url, close = stub_server(**kwargs)
+        closers.append(close)
+        return url
+    yield make
+    for close in closers:
+        close()
+
+
+def test_up_down_timeout_and_5xx(servers):
+    backends = {
+        "up": servers(status=200),
+        "redirect": servers(status=302),
+        "error": servers(status=503),
+        "slow": servers(delay=1.0),
+        "down": closed_port_url(),
+    }
+    health = BackendHealth(backends, timeout=0.3, start=False)
+    assert health.status("up") is None  # 尚未探測
+    health.check_all()
+
+    up = health.status("up")
+    assert up.up and up.status_code == 200 and up.latency_ms is not None
+    assert health.status("redirect").up
+    error = health.status("error")
+    assert not error.up and error.status_code == 503 and error.error == "HTTP 503"
+    slow = health.status("slow")
+    assert not slow.up and slow.status_code is None and "Timeout" in slow.error
+    down = health.status("down")
+    assert not down.up and down.error == "ConnectionError"
+
+
+def test_connection_is_reused(servers):
+    peers = []
+    health = BackendHealth({"up": servers(peers=peers)}, start=False)
+    for _ in range(3):
+        health.check_all()
+    # 三輪探測共用同一條連線 (用戶端埠號相同)
+    assert len(peers) == 3 and len(set(peers)) == 1
+
+
+def test_insecure_warning_is_silenced_only_for_backend_hosts():
+    def warn(host):
+        warnings.warn(f"Unverified HTTPS request is being made to host '{host}'. "
+                      "Adding certificate verification is strongly advised.", InsecureRequestWarning)
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        BackendHealth({"a": "https://10.0.0.1:8443/", "b": "https://nvr.example.com/"}, start=False)
+        warn("10.0.0.1")
+        warn("nvr.example.com")
+        warn("api.open-meteo.com")
+    assert [str(w.message).split("'")[1] for w in caught] == ["api.open-meteo.com"]
@@ -0,0 +1,115 @@
+import datetime
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pandas")
+from case_archive import ARCHIVE_PREFIX, ArchiveChanged, CaseArchive, archive_closed_months  # noqa: E402
+from sheet_stub import HEADER, SheetStub  # noqa: E402
+
+
+def dated(day, i):
+    return [f"{day} 10:00", "華視光復", f"客戶{i}", "0912345678", "ABC-1234", "無法找零", "描述", "宗哲"]
+
+
+class ArchiveSheet(SheetStub):
+    def __init__(self, rows, before_get=None):
+        super().__init__(rows)
+        self.before_get = before_get
+        self.deleted = None
+
+    def get(self, rng):
+        if self.before_get:
+            self.before_get(self)
+        return super().get(rng)
+
+    def append_rows(self, values, **kwargs):
+        self.rows.extend(list(v) for v in values)
+
+    def batch_update(self, data, **kwargs):
+        self.rows = [list(r) for r in data[0]["values"]]
+
+    def delete_rows(self, start, end):
+        self.deleted = (start, end)
+        del self.rows[start - 1:end]
+
+
+class PoolStub:
+    def __init__(self, ws):
+        self.sheets = {None: ws}
+
+    def worksheet(self, title, name=None, create=None):
+        if name not in self.sheets:
+            self.sheets[name] = create(self)
+        return self.sheets[name]
+
+    def add_worksheet(self, title, rows, cols):
+        return ArchiveSheet([])
+
+
+TODAY = datetime.date(2026, 10, 18)
+ROWS = [HEADER, dated("2026-07-30", 1), dated("2026-08-01", 2), dated("2026-10-01", 3)]
+
+
+def test_archives_prefix_and_deletes_it():
+    ws = ArchiveSheet(ROWS)
+    pool = PoolStub(ws)
+    assert archive_closed_months(pool, today=TODAY) == {"2026-07": 1, "2026-08": 1}
+    assert ws.rows == [HEADER, ROWS[3]]
+    assert pool.sheets[ARCHIVE_PREFIX + "2026-08"].rows == [HEADER, ROWS[2]]
+
+
+def test_aborts_when_prefix_changes_before_delete():
+    def edit(ws):
+        ws.rows[2] = dated("2026-08-01", 99)  # 封存期間有人編輯了待刪除的列
+
+    ws = ArchiveSheet(ROWS, before_get=edit)
+    with pytest.raises(ArchiveChanged):
+        archive_closed_months(PoolStub(ws), today=TODAY)
+    assert ws.deleted is None and len(ws.rows) == len(ROWS)
+
+
+class ArchivePoolStub:
+    """封存試算表替身：下載月份工作表時停在 release 之前"""
+
+    def __init__(self, months):
+        self.months = months
+        self.downloading = threading.Event()
+        self.release = threading.Event()
+
+    def spreadsheet(self, title):
+        return self
+
+    def worksheets(self):
+        return [SimpleNamespace(title=ARCHIVE_PREFIX + p, row_count=len(rows)) for p, rows in self.months.items()]
+
+    def worksheet(self, title, name):
+        rows = self.months[name[len(ARCHIVE_PREFIX):]]
+
+        def get_all_values():
+            self.downloading.set()
+            assert self.release.wait(5)
+            return rows
+        return SimpleNamespace(get_all_values=get_all_values)
+
+
+def test_download_does_not_block_period_check(tmp_path):
+    pytest.importorskip("pyarrow")
+    pool = ArchivePoolStub({"2026-07": [HEADER, dated("2026-07-30", 1)]})
+    archive = CaseArchive(pool, directory=str(tmp_path))
+    archive.check()
+    searching = threading.Thread(target=lambda: archive.search("客戶1"))
+    searching.start()
+    assert pool.downloading.wait(5)
+
+    # 第一次查詢下載中，背景執行緒的月份檢查不必等待
+    checker = threading.Thread(target=lambda: (archive.refresh(), archive.check()))
+    checker.start()
+    checker.join(1)
+    assert not checker.is_alive()
+
+    pool.release.set()
+    searching.join(5)
+    assert archive.search("客戶1") == [dated("2026-07-30", 1)]
+    assert archive.cube() is archive.cube()
@@ -0,0 +1,55 @@
+"""CaseStore 增量同步：以 gspread 6 的回傳格式模擬工作表"""
+from case_store import CaseStore
+from sheet_stub import HEADER, SheetStub, case
+
+
+def loaded(n=5):
+    ws = SheetStub([HEADER] + [case(i) for i in range(n)])
+    store = CaseStore()
+    store.sync(ws)
+    return ws, store
+
+
+def test_idle_delta_poll_adds_nothing():
+    ws, store = loaded()
+    version = store.version
+    for _ in range(5):
+        store.sync(ws, delta_interval=0)
+    assert store.version == version
+    assert len(store.current()[1]) == 6
+    assert store.stats["delta"] == 5
+
+
+def test_delta_appends_only_new_rows():
+    ws, store = loaded()
+    store.sync(ws, delta_interval=0)
+    ws.rows.append(case(5))
+    store.sync(ws, delta_interval=0)
+    store.sync(ws, delta_interval=0)
+    assert store.current()[1][1:] == [case(i) for i in range(6)]
+
+
+def test_record_appends_still_matches_after_idle_polls():
+    ws, store = loaded()
+    for _ in range(3):
+        store.sync(ws, delta_interval=0)
+    ws.rows.append(case(5))
+    store.record_appends([case(5)], {"updates": {"updatedRange": "工作表1!A7:H7"}})
+    assert len(store.current()[1]) == 7
+
+
+def test_verify_without_changes_does_not_reload():
+    ws, store = loaded()
+    store.sync(ws, delta_interval=0)
+    store.request_verify()
+    store.sync(ws)
+    assert store.stats == {"full": 1, "delta": 1, "verify": 1, "drift": 0}
+
+
+def test_verify_detects_external_edit():
+    ws, store = loaded()
+    ws.rows[2][6] = "外部修改"
+    store.request_verify()
+    store.sync(ws)
+    assert store.stats["drift"] == 1
+    assert store.current()[1][2][6] == "外部修改"
@@ -0,0 +1,45 @@
+"""型別化資料表：日期解析、排序與 time_slice / date_slice 的區間邊界"""
+import datetime
+
+import pytest
+
+pd = pytest.importorskip("pandas")
+from case_table import ROW_COL, build_case_table, date_slice, time_slice  # noqa: E402
+from sheet_stub import HEADER, case  # noqa: E402
+
+
+def at(ts, i):
+    r = case(i)
+    r[0] = ts
+    return r
+
+
+ROWS = [HEADER,
+        at("2026-10-02 09:00", 1),
+        at("2026-10-01 00:00", 2),
+        at("不是日期", 3),
+        at("2026-10-01 23:59", 4),
+        at("2026-10-03 00:00", 5)]
+
+
+def test_build_sorts_by_time_and_keeps_sheet_rows():
+    table = build_case_table(ROWS)
+    assert list(table[ROW_COL]) == [3, 5, 2, 6]     # 無法解析的第 4 列被捨棄
+    assert str(table["場站"].dtype) == "category"
+
+
+def test_time_slice_is_half_open():
+    table = build_case_table(ROWS)
+    s = time_slice(table, datetime.datetime(2026, 10, 1, 23, 59), datetime.datetime(2026, 10, 3))
+    assert list(s[ROW_COL]) == [5, 2]
+    assert list(time_slice(table)[ROW_COL]) == [3, 5, 2, 6]
+    assert list(time_slice(table, start=datetime.datetime(2026, 10, 3))[ROW_COL]) == [6]
+    assert time_slice(table, end=datetime.datetime(2026, 10, 1)).empty
+
+
+def test_date_slice_includes_both_ends():
+    table = build_case_table(ROWS)
+    day = datetime.date(2026, 10, 1)
+    assert list(date_slice(table, day, day)[ROW_COL]) == [3, 5]
+    assert list(date_slice(table, day, datetime.date(2026, 10, 3))[ROW_COL]) == [3, 5, 2, 6]
+    assert date_slice(table, datetime.date(2026, 9, 1), datetime.date(2026, 9, 30)).empty
@@ -0,0 +1,67 @@
+"""ChangeFeed：輪詢沒有新資料時版本號不變，衍生資料 (型別化資料表) 不必重建"""
+import threading
+
+from case_store import CaseStore
+from change_feed import ChangeFeed
+from sheet_stub import HEADER, SheetStub, case
+
+
+def make_feed(n=5):
+    ws = SheetStub([HEADER] + [case(i) for i in range(n)])
+    return ws, ChangeFeed(CaseStore(), lambda: ws, start=False)
+
+
+def test_idle_polls_keep_version():
+    ws, feed = make_feed()
+    version, rows = feed.snapshot()
+    for _ in range(10):
+        feed.poll()
+    assert feed.snapshot() == (version, rows)
+
+
+def test_poll_picks_up_new_rows():
+    ws, feed = make_feed()
+    version, _ = feed.snapshot()
+    ws.rows.append(case(5))
+    feed.poll()
+    new_version, rows = feed.snapshot()
+    assert new_version > version
+    assert rows[-1] == case(5)
+
+
+def test_identical_full_reload_keeps_version():
+    ws, feed = make_feed()
+    version, _ = feed.snapshot()
+    feed._store.invalidate()
+    feed.poll()
+    assert feed.snapshot()[0] == version
+    assert feed._store.stats["full"] == 2
+
+
+def test_repeated_patch_keeps_version():
+    ws, feed = make_feed()
+    store = feed._store
+    feed.snapshot()
+    edited = case(1)[:6] + ["已處理", "宗哲"]
+    store.patch(3, edited)
+    version = store.version
+    store.patch(3, edited)
+    assert store.version == version
+
+
+def test_tasks_run_in_background_even_when_poll_fails():
+    calls = []
+    done = threading.Event()
+
+    def task():
+        calls.append(threading.current_thread().name)
+        done.set()
+
+    def broken():
+        raise RuntimeError("429")
+
+    feed = ChangeFeed(CaseStore(), broken, interval=0.01)
+    feed.add_task(lambda: 1 / 0)   # 失敗的工作不影響其他工作
+    feed.add_task(task)
+    assert done.wait(2)
+    assert calls[0] == "change-feed"
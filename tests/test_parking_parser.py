@@ -0,0 +1,23 @@
+import pytest
+
+from parking_parser import PARSERS, SpotReading, parse_spots, parse_xpath
+
+PAGE = '<html><body><span id="ContentPlaceHolder1_lblAvailableCar">42</span></body></html>'
+
+
+@pytest.mark.parametrize("body", [b"", b"  \r\n", ""])
+def test_empty_body_is_no_data(body):
+    assert parse_spots(body) == SpotReading.failed("暫無數據", source="none")
+
+
+def test_xpath_ignores_unparsable_body():
+    pytest.importorskip("lxml")
+    assert parse_xpath(b"") is None
+    assert parse_xpath(b"   ") is None
+
+
+def test_each_layer_reads_the_spots_element():
+    assert parse_spots(PAGE).spots == 42
+    for parser in PARSERS:
+        reading = parser(PAGE.encode())
+        assert reading is None or reading.spots == 42
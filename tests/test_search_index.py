@@ -0,0 +1,82 @@
+"""SearchIndex：延遲建立前後的增量維護與欄位前綴的正規化"""
+import re
+
+from search_index import SearchIndex
+from sheet_stub import HEADER, case
+
+
+def plate(s):
+    # 與 streamlit_app.format_car_number 相同的規則
+    s = s.replace("-", "").strip().upper()
+    m = re.match(r"([A-Z]+)([0-9]+)", s) or re.match(r"([0-9]+)([A-Z]+)", s)
+    return f"{m.group(1)}-{m.group(2)}" if m else s
+
+
+def row(i, **cols):
+    r = case(i)
+    for col, value in cols.items():
+        r[HEADER.index(col)] = value
+    return r
+
+
+def linear(rows, query):
+    """線性掃描的參考結果 (不含欄位前綴)"""
+    terms = query.lower().split()
+    return [i for i, r in enumerate(rows[1:], start=2) if all(t in "\x1f".join(r).lower() for t in terms)]
+
+
+def make_index(rows):
+    index = SearchIndex(normalize_plate=plate)
+    index.reset(rows)
+    return index
+
+
+def test_extend_and_patch_before_build():
+    rows = [HEADER, row(1), row(2)]
+    index = make_index(rows)
+    index.extend(4, [row(3, 姓名="王小明")])
+    index.patch(2, rows[1], row(1, 描述="遠端重新開機"))
+    assert index.search("王小明") == [4]
+    assert index.search("遠端重新") == [2]
+    assert index.search("客戶1") == [2]
+
+
+def test_extend_and_patch_after_build():
+    rows = [HEADER, row(1), row(2, 描述="卡紙")]
+    index = make_index(rows)
+    assert index.search("卡紙") == [3]          # 第一次查詢時建立索引
+    index.extend(4, [row(3, 描述="卡紙後恢復")])
+    index.patch(3, rows[2], row(2, 描述="找零不足"))
+    assert index.search("卡紙") == [4]
+    assert index.search("找零不足") == [3]
+    index.patch(1, HEADER, HEADER)              # 標題列不進索引
+    assert index.search("時間") == []
+
+
+def test_matches_linear_scan():
+    rows = [HEADER] + [row(i, 描述=f"第{i}號 {'發票' if i % 3 else '網路'}異常") for i in range(30)]
+    index = make_index(rows)
+    for query in ("發票", "網路 異常", "客戶1", "第2號", "號", "不存在"):
+        assert index.search(query) == linear(rows, query)
+
+
+def test_plate_prefix_normalizes_dashes_and_case():
+    index = make_index([HEADER, row(1, 車號="ABC-1234"), row(2, 車號="5678xy"), row(3, 車號="", 描述="abc1234")])
+    assert index.search("plate:abc1234") == [2]
+    assert index.search("車號:ABC-1234") == [2]
+    assert index.search("plate:5678-XY") == [3]
+    assert index.search("abc1234") == [2, 4]    # 不加前綴時比對所有欄位
+
+
+def test_phone_prefix_matches_digits_only():
+    index = make_index([HEADER, row(1, 電話="0912-345-678"), row(2, 電話="0922333444", 描述="0912345678")])
+    assert index.search("phone:0912345678") == [2]
+    assert index.search("電話:0912 678") == [2]  # 空白分隔為兩個詞 (AND)
+    assert index.search("phone:(0922)333-444") == [3]
+
+
+def test_field_prefix_combined_with_free_text():
+    index = make_index([HEADER, row(1, 場站="碧華國小"), row(2, 場站="華視光復", 描述="碧華國小客戶轉介")])
+    assert index.search("station:碧華") == [2]
+    assert index.search("碧華") == [2, 3]
+    assert index.search("station:華視 碧華") == [3]
@@ -0,0 +1,76 @@
+"""StatsCube：增量維護的件數與重新計算一致，修補時舊鍵遞減、歸零即移除"""
+import datetime
+
+import pytest
+
+pytest.importorskip("pandas")
+from sheet_stub import HEADER, case  # noqa: E402
+from stats_cube import CombinedCube, StatsCube  # noqa: E402
+
+D1, D2, D3 = datetime.date(2026, 10, 1), datetime.date(2026, 10, 2), datetime.date(2026, 10, 3)
+
+
+def at(day, station="華視光復", category="無法找零", i=0):
+    r = case(i)
+    r[0], r[1], r[5] = f"{day} 10:00", station, category
+    return r
+
+
+def counts(cube, first=None, last=None):
+    return {(r.日期, r.場站, r.類別): r.件數 for r in cube.frame(first, last).itertuples()}
+
+
+def test_incremental_matches_reset():
+    rows = [HEADER, at(D1), at(D1), at(D2, "碧華國小"), at(D2, category="其他"), at(D3, category="網路異常")]
+    inc = StatsCube()
+    inc.reset(rows[:2])
+    inc.extend(3, rows[2:])
+    full = StatsCube()
+    full.reset(rows)
+    assert counts(inc) == counts(full) == {
+        (D1, "華視光復", "無法找零"): 2,
+        (D2, "碧華國小", "無法找零"): 1,
+        (D3, "華視光復", "網路異常"): 1,
+    }
+
+
+def test_patch_moves_count_and_drops_zero_keys():
+    old = at(D1)
+    cube = StatsCube()
+    cube.reset([HEADER, old, at(D2)])
+    cube.patch(2, old, at(D1, category="發票缺紙或卡紙"))
+    assert counts(cube, D1, D1) == {(D1, "華視光復", "發票缺紙或卡紙"): 1}
+    cube.patch(2, at(D1, category="發票缺紙或卡紙"), at(D1, category="其他"))   # 改成排除的類別
+    assert counts(cube, D1, D1) == {}
+    cube.patch(1, HEADER, HEADER)
+    assert counts(cube) == {(D2, "華視光復", "無法找零"): 1}
+
+
+def test_frame_range_is_inclusive():
+    cube = StatsCube()
+    cube.reset([HEADER, at(D1), at(D2), at(D3)])
+    assert sorted(d for d, _, _ in counts(cube, D2, D3)) == [D2, D3]
+    assert sorted(d for d, _, _ in counts(cube, last=D1)) == [D1]
+    assert cube.last_day() == D3
+
+
+def test_start_for_last():
+    cube = StatsCube()
+    cube.reset([HEADER, at(D1), at(D2), at(D2), at(D3)])
+    assert cube.start_for_last(1) == D3
+    assert cube.start_for_last(3) == D2
+    assert cube.start_for_last(100) == D1
+    assert StatsCube().start_for_last(5) is None
+
+
+def test_combined_cube_adds_up_hot_and_archived():
+    hot, archived = StatsCube(), StatsCube()
+    hot.reset([HEADER, at(D2), at(D3)])
+    archived.reset([HEADER, at(D1), at(D1), at(D2)])
+    combined = CombinedCube(hot, archived, None)
+    frame = combined.frame()
+    assert frame.groupby("日期")["件數"].sum().to_dict() == {D1: 2, D2: 2, D3: 1}
+    assert combined.start_for_last(3) == D2
+    assert combined.start_for_last(4) == D1
+    assert combined.last_day() == D3
+    assert CombinedCube(hot).frame().equals(hot.frame())
@@ -0,0 +1,131 @@
+from case_store import CaseStore
+from sheet_stub import HEADER, SheetStub, case
+from write_queue import WriteQueue
+
+
+class APIError(Exception):
+    def __init__(self, code):
+        super().__init__(f"APIError {code}")
+        self.code = code
+
+
+class WritableStub(SheetStub):
+    """加上寫入 API；fail 為待注入的錯誤，timeout_after_write 模擬已寫入但回應逾時"""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.fail = {}
+        self.timeout_after_write = False
+
+    def _check(self, name, payload):
+        err = self.fail.get(name)
+        if callable(err):
+            err = err(payload)
+        if err:
+            raise err
+
+    def append_rows(self, values, **kwargs):
+        self._check("append_rows", values)
+        start = len(self.rows) + 1
+        self.rows.extend(list(v) for v in values)
+        if self.timeout_after_write:
+            self.timeout_after_write = False
+            raise TimeoutError("read timed out")
+        return {"updates": {"updatedRange": f"'sheet'!A{start}:H{len(self.rows)}"}}
+
+    def batch_update(self, data, **kwargs):
+        self._check("batch_update", data)
+        for d in data:
+            row = int(d["range"][1:].split(":")[0])
+            self.rows[row - 1] = list(d["values"][0])
+
+
+def make_queue(tmp_path, ws):
+    store = CaseStore()
+    store.sync(ws)
+    # 不啟動背景執行緒，測試中手動 flush
+    return WriteQueue(lambda: ws, store, str(tmp_path / "journal.jsonl"), start=False), store
+
+
+def test_bad_update_goes_to_dead_letter_and_appends_still_flush(tmp_path):
+    ws = WritableStub([HEADER, case(1), case(2)])
+    q, store = make_queue(tmp_path, ws)
+    ws.fail["batch_update"] = APIError(400)
+    q.enqueue_update(2, case(9))
+    q.enqueue_append(case(3))
+    q.flush()
+    assert ws.rows[-1] == case(3)
+    assert q.pending_count() == 0
+    assert [op["op"] for op in q.dead] == ["update"]
+    assert "400" in q.dead[0]["error"]
+    # dead letter 保存在本地，重啟後仍看得到
+    assert len(WriteQueue(lambda: ws, store, str(tmp_path / "journal.jsonl"), start=False).dead) == 1
+
+
+def test_only_the_bad_row_is_dead_lettered(tmp_path):
+    ws = WritableStub([HEADER, case(1)])
+    q, _ = make_queue(tmp_path, ws)
+    ws.fail["append_rows"] = lambda rows: APIError(400) if case(66) in rows else None
+    for i in (2, 66, 3):
+        q.enqueue_append(case(i))
+    q.flush()
+    assert ws.rows[1:] == [case(1), case(2), case(3)]
+    assert [op["row"] for op in q.dead] == [case(66)]
+
+    ws.fail.clear()
+    q.retry_dead()
+    q.flush()
+    assert ws.rows[-1] == case(66) and not q.dead
+
+
+def test_retryable_error_keeps_ops_pending(tmp_path):
+    ws = WritableStub([HEADER, case(1)])
+    q, _ = make_queue(tmp_path, ws)
+    ws.fail["append_rows"] = APIError(429)
+    q.enqueue_append(case(2))
+    try:
+        q.flush()
+    except APIError:
+        pass
+    assert q.pending_count() == 1 and not q.dead
+
+
+def test_append_timeout_is_not_written_twice(tmp_path):
+    ws = WritableStub([HEADER, case(1)])
+    q, _ = make_queue(tmp_path, ws)
+    ws.timeout_after_write = True
+    q.enqueue_append(case(2))
+    try:
+        q.flush()
+    except TimeoutError:
+        pass
+    assert q.pending_count() == 1
+    q.flush()
+    assert ws.rows == [HEADER, case(1), case(2)]
+    assert q.pending_count() == 0 and q.stats["deduped"] == 1
+
+
+def test_journal_replay_after_crash_skips_rows_already_written(tmp_path):
+    ws = WritableStub([HEADER, case(1)])
+    q, _ = make_queue(tmp_path, ws)
+    q.enqueue_append(case(2))
+    q.enqueue_append(case(3))
+    ws.rows.append(case(2))  # 程序在 append_rows 成功後、_done 之前中斷
+
+    q2, _ = make_queue(tmp_path, ws)
+    q2.flush()
+    assert ws.rows == [HEADER, case(1), case(2), case(3)]
+    assert q2.pending_count() == 0
+
+
+def test_update_of_row_changed_in_sheet_is_dead_lettered(tmp_path):
+    ws = WritableStub([HEADER, case(1), case(2)])
+    q, _ = make_queue(tmp_path, ws)
+    q.enqueue_update(2, case(1)[:7] + ["已處理"], old=case(1))
+    ws.rows[1][6] = "試算表中直接修改"
+    external = list(ws.rows[1])
+    q.flush()
+    assert ws.rows[1] == external        # 不覆寫別人的修改
+    assert q.pending_count() == 0
+    assert [op["op"] for op in q.dead] == ["update"]
+    assert "找不到原案件" in q.dead[0]["error"]
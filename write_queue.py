@@ -0,0 +1,304 @@
+"""案件寫入佇列 (write-behind)：先寫本地日誌，再由背景執行緒合併成 append_rows / batch_update 送出"""
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+
+import perf
+from case_store import col_letter
+
+JOURNAL_FILE = "pending_writes.jsonl"
+FLUSH_INTERVAL = 2       # 秒：背景執行緒最長等待時間 (有新資料會立即喚醒)
+MAX_BACKOFF = 60         # 秒：重試間隔上限
+RETRY_STATUS = {429, 500, 502, 503, 504}
+UNSURE_TAIL = 50         # 結果不明的新增重送前，比對作業表尾端的額外列數 (其他 session 期間新增的案件)
+
+
+def _status_code(e):
+    # gspread 6 的 APIError 有 .code；gspread 5 需從 response 取得
+    code = getattr(e, "code", None)
+    if code is None:
+        code = getattr(getattr(e, "response", None), "status_code", None)
+    return code
+
+
+def _retryable(e):
+    """429 / 5xx 與連線錯誤 (沒有狀態碼) 可重試；其他 4xx 重送也不會成功"""
+    code = _status_code(e)
+    return code is None or code in RETRY_STATUS
+
+
+class WriteQueue:
+    """待寫入的案件先 fsync 到 JOURNAL_FILE，程序重啟後會自動重送。
+
+    - 同一批次的新增合併成一次 append_rows，編輯合併成一次 batch_update (同一列只送最後一次)；
+      兩者各自送出，編輯失敗不會擋住新增的案件
+    - 429 / 5xx 或連線錯誤以指數退避重試
+    - 不可重試的錯誤 (例如 400) 改為逐筆送出找出有問題的那筆，移到 dead letter
+      (JOURNAL_FILE + ".dead") 並顯示給客服人員，不再阻擋其他案件
+    - 新增為 at-least-once：逾時或程序中斷時無法得知是否已寫入，重送前先同步作業表尾端比對，
+      已存在的案件不再重複新增
+    - 寫入成功後直接修補 CaseStore，不需重新下載整張表
+    - 編輯附帶編輯前的內容，送出前先確認目標列未因封存而位移，位移時依內容找回新列號；
+      找不到原案件 (已封存、刪除或在試算表中被直接修改) 時移到 dead letter，不會默默放棄
+    """
+
+    def __init__(self, ws_getter, store, journal=JOURNAL_FILE, width=8, start=True):
+        self._ws_getter = ws_getter
+        self._store = store
+        self._journal = journal
+        self._dead_file = journal + ".dead"
+        self._width = width
+        self._lock = threading.Lock()
+        self._pending = self._load(self._journal)
+        self._unsure = {op["id"] for op in self._pending}  # 上次程序中斷前可能已送出
+        self.dead = self._load(self._dead_file)
+        self._wake = threading.Event()
+        self._backoff = 0
+        self.last_error = None
+        self.stats = {"flush": 0, "appended": 0, "updated": 0, "retry": 0, "dead": 0, "deduped": 0}
+        self._thread = threading.Thread(target=self._run, name="write-queue", daemon=True)
+        if start:
+            self._thread.start()
+
+    # --- 本地日誌 ---
+    def _load(self, path):
+        if not os.path.exists(path):
+            return []
+        ops = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    ops.append(json.loads(line))
+                except ValueError:
+                    continue  # 寫到一半的最後一行
+        return ops
+
+    def _append_journal(self, op):
+        with open(self._journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _rewrite(self, path, ops):
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for op in ops:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _rewrite_journal(self):
+        self._rewrite(self._journal, self._pending)
+
+    # --- 對外介面 ---
+    def _enqueue(self, op):
+        op["id"] = uuid.uuid4().hex
+        with self._lock:
+            self._append_journal(op)
+            self._pending.append(op)
+        self._wake.set()
+
+    def enqueue_append(self, row):
+        self._enqueue({"op": "append", "row": list(row)})
+
+    def enqueue_update(self, row_idx, row, old=None):
+        """old 為編輯前的內容；送出時若該列內容已不同 (例如封存後列號位移)，改以 old 找回正確的列"""
+        self._store.patch(row_idx, row, expected=old)  # 樂觀更新：畫面立即顯示新內容
+        op = {"op": "update", "idx": row_idx, "row": list(row)}
+        if old is not None:
+            op["old"] = [str(c) for c in old]
+        self._enqueue(op)
+
+    def pending_rows(self):
+        """尚未寫入雲端的新增案件 (顯示為「排隊中」)"""
+        with self._lock:
+            return [op["row"] for op in self._pending if op["op"] == "append"]
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def retry_dead(self):
+        """把 dead letter 重新排入佇列 (修正問題後由客服人員手動觸發)"""
+        with self._lock:
+            ops = [{k: v for k, v in op.items() if k != "error"} for op in self.dead]
+            self._pending.extend(ops)
+            self._rewrite_journal()
+            self.dead = []
+            self._rewrite(self._dead_file, self.dead)
+        self._wake.set()
+
+    def clear_dead(self):
+        with self._lock:
+            self.dead = []
+            self._rewrite(self._dead_file, self.dead)
+
+    # --- 背景送出 ---
+    def _run(self):
+        while True:
+            self._wake.wait(FLUSH_INTERVAL)
+            self._wake.clear()
+            try:
+                with perf.span("write_queue.flush"):
+                    self.flush()
+                self._backoff = 0
+                self.last_error = None
+            except Exception as e:
+                self.last_error = str(e)
+                self.stats["retry"] += 1
+                perf.incr("write_queue.retry")
+                if _retryable(e):
+                    self._backoff = min(MAX_BACKOFF, (self._backoff or 1) * 2) + random.random()
+                else:
+                    self._backoff = MAX_BACKOFF
+                time.sleep(self._backoff)
+
+    def _done(self, ids):
+        with self._lock:
+            self._pending = [op for op in self._pending if op["id"] not in ids]
+            self._rewrite_journal()
+
+    def _dead_letter(self, ops, error):
+        ids = {op["id"] for op in ops}
+        with self._lock:
+            self.dead.extend(dict(op, error=error) for op in ops)
+            self._rewrite(self._dead_file, self.dead)
+            self._pending = [op for op in self._pending if op["id"] not in ids]
+            self._rewrite_journal()
+        self._unsure -= ids
+        self.stats["dead"] += len(ops)
+        perf.incr("write_queue.dead", len(ops))
+        if any(op["op"] == "update" for op in ops):
+            self._store.invalidate()  # 撤銷畫面上的樂觀更新
+
+    def _send(self, items, send, ops_of):
+        """送出一批；不可重試的錯誤改為逐筆送出，只把失敗的那筆移到 dead letter"""
+        try:
+            send(items)
+        except Exception as e:
+            if _retryable(e):
+                raise
+            if len(items) == 1:
+                self._dead_letter(ops_of(items[0]), f"{type(e).__name__}: {e}")
+                return
+            for item in items:
+                self._send([item], send, ops_of)
+
+    def _norm(self, row):
+        row = [str(c) for c in row[:self._width]]
+        return row + [""] * (self._width - len(row))
+
+    def _resolve(self, ws, updates, expected):
+        """確認待編輯的列仍在原位置，回傳 ({原列號: 目前列號 (已是新內容為 None)}, 找不到原案件的原列號)；
+        列號已位移時重新載入 CaseStore，依編輯前的內容找回新列號"""
+        targets, lost = {i: i for i in updates}, set()
+        if not expected:
+            return targets, lost
+        last = col_letter(self._width)
+        idxs = list(expected)
+        current = ws.batch_get([f"A{i}:{last}{i}" for i in idxs])
+        moved = [i for i, cur in zip(idxs, current)
+                 if self._norm(cur[0] if cur else []) not in [self._norm(r) for r in expected[i]]]
+        if not moved:
+            return targets, lost
+        self._store.invalidate()
+        self._store.snapshot(ws)
+        for i in moved:
+            targets[i] = self._store.find(expected[i][0])
+            if targets[i] is None and self._store.find(updates[i]) is None:
+                lost.add(i)
+        return targets, lost
+
+    def _already_appended(self, ws, ops):
+        """結果不明的新增：同步作業表尾端，回傳已存在 (上次其實已寫入) 的 op id"""
+        self._store.sync(ws, delta_interval=0)
+        _, rows = self._store.current()
+        tail = Counter(tuple(self._norm(r)) for r in rows[-(len(ops) + UNSURE_TAIL):])
+        sent = set()
+        for op in ops:
+            key = tuple(self._norm(op["row"]))
+            if tail[key]:
+                tail[key] -= 1
+                sent.add(op["id"])
+        return sent
+
+    def _flush_updates(self, ws, batch):
+        ops = [op for op in batch if op["op"] == "update"]
+        if not ops:
+            return
+        last = col_letter(self._width)
+        updates, expected, by_idx = {}, {}, {}
+        for op in ops:
+            updates[op["idx"]] = op["row"]
+            by_idx.setdefault(op["idx"], []).append(op)
+            if "old" in op:
+                expected.setdefault(op["idx"], []).extend([op["old"], op["row"]])
+        targets, lost = self._resolve(ws, updates, expected)
+        if lost:
+            # 原案件已封存、刪除或在試算表中被直接修改：不覆寫，交給客服人員確認後重新編輯
+            self._dead_letter([op for i in lost for op in by_idx[i]],
+                              "找不到原案件 (已封存、刪除或在試算表中被修改)，編輯未寫入")
+        skipped = [op for i, t in targets.items() if t is None and i not in lost for op in by_idx[i]]
+        if skipped:
+            self._done({op["id"] for op in skipped})
+        items = [(t, updates[i], by_idx[i]) for i, t in targets.items() if t is not None]
+
+        def send(items):
+            ws.batch_update([{"range": f"A{t}:{last}{t}", "values": [r]} for t, r, _ in items])
+            for t, r, _ in items:
+                self._store.patch(t, r)
+            self.stats["updated"] += len(items)
+            self._done({op["id"] for _, _, item_ops in items for op in item_ops})
+
+        if items:
+            self._send(items, send, lambda item: item[2])
+
+    def _flush_appends(self, ws, batch):
+        ops = [op for op in batch if op["op"] == "append"]
+        unsure = [op for op in ops if op["id"] in self._unsure]
+        if unsure:
+            sent = self._already_appended(ws, unsure)
+            if sent:
+                self.stats["deduped"] += len(sent)
+                self._done(sent)
+                ops = [op for op in ops if op["id"] not in sent]
+            self._unsure -= {op["id"] for op in unsure}
+        if not ops:
+            return
+
+        def send(ops):
+            rows = [op["row"] for op in ops]
+            ids = {op["id"] for op in ops}
+            self._unsure |= ids  # 逾時等錯誤時無法得知是否已寫入，下次重送前先比對
+            resp = ws.append_rows(rows)
+            self._unsure -= ids
+            self._store.record_appends(rows, resp)
+            self.stats["appended"] += len(rows)
+            self._done(ids)
+
+        self._send(ops, send, lambda op: [op])
+
+    def flush(self):
+        with self._lock:
+            batch = list(self._pending)
+        if not batch:
+            return
+        ws = self._ws_getter()
+        self.stats["flush"] += 1
+        # 編輯與新增各自送出：其中一邊暫時失敗時，另一邊照常寫入
+        errors = []
+        for part in (self._flush_appends, self._flush_updates):
+            try:
+                part(ws, batch)
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]